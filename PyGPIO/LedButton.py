@@ -1,5 +1,5 @@
 import pygpiolib as gpio
-import time
+import pwm
 import threading
 import sys
 import argparse
@@ -9,43 +9,52 @@ class LegButtonThread:
     """
     Класс инкапсулирующий запуск светодиода и управляющей интенсивностью его горения кнопки в разных потоках
     """
-    def __init__(self, gpio_led: int, gpio_button: int, edge: str = 'rising', counter: float = 0.5, step: float = .025):
+    def __init__(self, gpio_led: int, gpio_button: int, edge: str = 'rising', counter: float = 0.5, step: float = .025,
+                 debounce: float = 0.05, engine: pwm.PwmEngine = None):
         """
         :param gpio_led: SYSFSID/GPIO линия соответствующие светодиоду
         :param gpio_button: SYSFSID/GPIO линия соответствующие кнопке
         :param edge: состояние edge -- rising, both и т.д.
         :param counter: стартовая интенсивность горения светодиода.
         :param step: шаг, на который уменьшится (ускорится) интенсивность горения светодиода после нажатия на кнопку
+        :param debounce: время подавления дребезга контактов кнопки в секундах
+        :param engine: программный ШИМ, общий для нескольких светодиодов. По умолчанию создается собственный
         """
         self.counter = counter
         self.step = step
         self.lock = threading.Lock()
-        self.button = gpio.Button(gpio_button, edge)
-        self.led = gpio.Led(gpio_led)
+        self.engine = engine if engine is not None else pwm.PwmEngine()
+        self.own_engine = engine is None
+        self.button = gpio.Button(gpio_button, edge, debounce=debounce)
+        self.led = gpio.Led(gpio_led, cached=True)
 
     def update(self):
-        """Обработка нажатия на кнопку"""
+        """Обработка нажатия на кнопку: каждое нажатие ускоряет мигание светодиода"""
         with self.button:
             while self.counter > self.step:
-                if self.button.click():
+                # Таймаут позволяет завершить поток, когда counter изменен не этим потоком
+                if self.button.click(timeout=1):
                     with self.lock:
                         self.counter -= self.step
+                        if self.counter > self.step:
+                            self.engine.set(self.led, frequency=self.frequency())
 
-    def blink(self):
-        """Изменение атрибута step после нажатия на кнопку и соответственно иетенсивности горения светодиода"""
-        with self.led:
-            while self.counter > self.step:
-                self.led.switch()
-                time.sleep(self.counter)
+    def frequency(self) -> float:
+        """Светодиод переключается каждые counter секунд: период мигания -- 2 * counter"""
+        return 1 / (2 * self.counter)
 
     def start(self):
         try:
-            led_thread = threading.Thread(target=self.blink)
-            button_thread = threading.Thread(target=self.update)
-            led_thread.start()
-            button_thread.start()
-            led_thread.join()
-            button_thread.join()
+            with self.led:
+                if self.own_engine:
+                    self.engine.start()
+                self.engine.add(self.led, self.frequency(), 0.5)
+                try:
+                    self.update()
+                finally:
+                    self.engine.remove(self.led)
+                    if self.own_engine:
+                        self.engine.stop()
         except KeyboardInterrupt:
             # Обработка Ctrl+C
             self.button.close()
@@ -63,6 +72,8 @@ if __name__ == "__main__":
     #  -s агрумент соответствующий шагу, на который уменьшится (ускорится) интенсивность горения светодиода после
     #  нажатия на кнопку
     parser.add_argument('-s', '--step', type=float, default=0.025)
+    # -d аргумент соответствующий времени подавления дребезга контактов кнопки в секундах
+    parser.add_argument('-d', '--debounce', type=float, default=0.05)
     arg = parser.parse_args(sys.argv[1:])
-    job = LegButtonThread(arg.led, arg.button, counter=arg.counter, step=arg.step)
+    job = LegButtonThread(arg.led, arg.button, counter=arg.counter, step=arg.step, debounce=arg.debounce)
     job.start()
@@ -0,0 +1,217 @@
+import pygpiolib as gpio
+import simgpio
+import server
+import contextlib
+import io
+import json
+import platform
+import socket
+import threading
+import time
+import argparse
+import sys
+
+
+def summary(samples: list) -> dict:
+    """
+    Сводка по замерам задержки
+    :param samples: задержки в наносекундах
+    :return: количество замеров и задержки в микросекундах -- среднее, минимум, p50, p99, максимум
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def percentile(q):
+        return ordered[min(count - 1, int(q * count))] / 1000
+
+    return {'count': count,
+            'mean_us': sum(ordered) / count / 1000,
+            'min_us': ordered[0] / 1000,
+            'p50_us': percentile(0.5),
+            'p99_us': percentile(0.99),
+            'max_us': ordered[-1] / 1000}
+
+
+def led_toggles(gpio_line: int, count: int, cached: bool) -> float:
+    """
+    Измеряет количество переключений светодиода в секунду
+    :param gpio_line: SYSFSID/GPIO линия соответствующая светодиоду
+    :param count: количество переключений
+    :param cached: использовать ли постоянно открытый файл value
+    :return: переключений в секунду
+    """
+    with gpio.Led(gpio_line, cached=cached) as led:
+        start = time.perf_counter()
+        for _ in range(count):
+            led.switch()
+        elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def led_write_latency(gpio_line: int, count: int, cached: bool) -> dict:
+    """Задержка одной записи Led.value"""
+    samples = []
+    with gpio.Led(gpio_line, cached=cached) as led:
+        for i in range(count):
+            start = time.perf_counter_ns()
+            led.value = i & 1
+            samples.append(time.perf_counter_ns() - start)
+    return summary(samples)
+
+
+def open_close_cycle(gpio_line: int, count: int) -> dict:
+    """Стоимость цикла gpio_open/gpio_close"""
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter_ns()
+        gpio.gpio_open(gpio_line, 'out')
+        gpio.gpio_close(gpio_line)
+        samples.append(time.perf_counter_ns() - start)
+    return summary(samples)
+
+
+def click_latency(sim: simgpio.SimulatedBackend, gpio_line: int, count: int, delay: float = 0.001) -> dict:
+    """
+    Задержка от вызова события на линии (inject) до возврата из Button.click()
+    :param sim: имитация, через которую вызываются события
+    :param delay: пауза перед событием, чтобы click() успел заблокироваться
+    """
+    samples = []
+    ready = threading.Event()
+    injected = [0]
+
+    def injector():
+        for _ in range(count):
+            ready.wait()
+            ready.clear()
+            time.sleep(delay)
+            sim.inject(gpio_line, 0)
+            injected[0] = time.perf_counter_ns()
+            sim.inject(gpio_line, 1)
+
+    with gpio.Button(gpio_line, 'rising', cached=True) as button:
+        thread = threading.Thread(target=injector)
+        thread.start()
+        for _ in range(count):
+            ready.set()
+            button.click()
+            samples.append(time.perf_counter_ns() - injected[0])
+        thread.join()
+    return summary(samples)
+
+
+@contextlib.contextmanager
+def serve(sim: simgpio.SimulatedBackend, gpio_button: int, **kwargs):
+    """
+    Запускает server.Architect на loopback и останавливает его событием на кнопке при выходе. Вывод сервера
+    подавляется, чтобы не смешивать его с результатами
+    :return: (сервер, сокет клиента, подключенный к серверу)
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    architect = server.Architect(port, gpio_button, ip="127.0.0.1", **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread = threading.Thread(target=architect.start)
+        thread.start()
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            client.settimeout(1)
+            client.connect(("127.0.0.1", port))
+            # Ожидание запуска сервера
+            while True:
+                client.send(b'1')
+                try:
+                    client.recv(architect.size)
+                    break
+                except (socket.timeout, ConnectionRefusedError):
+                    pass
+            try:
+                yield architect, client
+            finally:
+                while thread.is_alive():
+                    sim.inject(gpio_button, 0)
+                    sim.inject(gpio_button, 1)
+                    thread.join(0.1)
+
+
+def udp_round_trip(sim: simgpio.SimulatedBackend, gpio_button: int, count: int) -> dict:
+    """Задержка запрос-ответ через server.Architect на loopback"""
+    samples = []
+    with serve(sim, gpio_button) as (architect, client):
+        start = time.perf_counter()
+        for _ in range(count):
+            sent = time.perf_counter_ns()
+            client.send(b'1')
+            client.recv(architect.size)
+            samples.append(time.perf_counter_ns() - sent)
+        elapsed = time.perf_counter() - start
+    result = summary(samples)
+    result['round_trips_per_s'] = count / elapsed
+    return result
+
+
+def udp_throughput(sim: simgpio.SimulatedBackend, gpio_button: int, count: int, window: int = 64,
+                   log_every: int = 0) -> float:
+    """
+    Пропускная способность server.Architect: клиент держит window запросов без ответа
+    :param log_every: печать пакетов сервером (см. server.Architect)
+    :return: обработанных пакетов в секунду
+    """
+    with serve(sim, gpio_button, log_every=log_every) as (architect, client):
+        start = time.perf_counter()
+        sent = received = 0
+        while received < count:
+            while sent < count and sent - received < window:
+                client.send(b'1')
+                sent += 1
+            client.recv(architect.size)
+            received += 1
+        elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def run(count: int, led: int, button: int, hardware: bool = False) -> dict:
+    """
+    Выполняет все замеры. Без hardware -- на имитации sysfs (simgpio), иначе -- на линиях платы (замеры, требующие
+    вызова событий на кнопке, пропускаются)
+    """
+    results = {}
+    with contextlib.ExitStack() as stack:
+        sim = None if hardware else stack.enter_context(simgpio.SimulatedBackend())
+        results['led_toggles_per_s'] = led_toggles(led, count, cached=False)
+        results['led_toggles_per_s_cached'] = led_toggles(led, count, cached=True)
+        results['led_write'] = led_write_latency(led, count, cached=False)
+        results['led_write_cached'] = led_write_latency(led, count, cached=True)
+        results['open_close'] = open_close_cycle(led, max(1, count // 10))
+        if sim is not None:
+            results['click_wakeup'] = click_latency(sim, button, max(1, count // 100))
+            results['udp_round_trip'] = udp_round_trip(sim, button, max(1, count // 10))
+            results['udp_packets_per_s'] = udp_throughput(sim, button, count)
+            results['udp_packets_per_s_logged'] = udp_throughput(sim, button, count, log_every=1)
+    return {'version': gpio.__version__,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'backend': 'sysfs' if hardware else 'simulated',
+            'count': count,
+            'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    # -l аргумент соответствующий SYSFSID светодиода
+    parser.add_argument('-l', '--led', type=int, default=10)
+    # -b аргумент соответствующий SYSFSID кнопки
+    parser.add_argument('-b', '--button', type=int, default=11)
+    # -n количество операций в основных замерах
+    parser.add_argument('-n', '--count', type=int, default=10000)
+    # -o файл для результатов в формате JSON, по умолчанию -- стандартный вывод
+    parser.add_argument('-o', '--output', type=str, default=None)
+    # --hardware замеры на линиях платы вместо имитации
+    parser.add_argument('--hardware', action='store_true')
+    arg = parser.parse_args(sys.argv[1:])
+    report = run(arg.count, arg.led, arg.button, arg.hardware)
+    if arg.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(arg.output, 'w') as wr:
+            json.dump(report, wr, indent=2)
@@ -1,8 +1,12 @@
 import socket
 import pygpiolib as gpio
-import threading
+import asyncio
+import protocol
 import argparse
 import sys
+import threading
+import time
+import random
 
 
 def get_ip():
@@ -11,57 +15,351 @@ def get_ip():
     return ip.getsockname()[0]
 
 
+class Subscribers:
+    """
+    Реестр подписчиков на нажатия кнопки: адрес -> время последнего пакета (time.monotonic). Любой пакет клиента
+    регистрирует его или продлевает подписку, b'-1' (OP_STOP в двоичном формате) -- отменяет ее. Подписчики, от которых
+    не было пакетов дольше ttl секунд, удаляются.
+    """
+    def __init__(self, ttl: float = 60.0):
+        """
+        :param ttl: время жизни подписки без пакетов от клиента в секундах, 0 -- без ограничения
+        """
+        self.ttl = ttl
+        self.__seen = {}
+        self.__lock = threading.Lock()
+
+    def update(self, data, address) -> bool:
+        """
+        Обрабатывает пакет клиента
+        :return: True если клиент подписан впервые
+        """
+        try:
+            if protocol.is_binary(data):
+                stop = any(command.op == protocol.OP_STOP for command in protocol.decode(data)[1])
+            else:
+                stop = bytes(data).strip() == b'-1'
+        except ValueError:
+            return False
+        if stop:
+            self.remove(address)
+            return False
+        return self.add(address)
+
+    def add(self, address) -> bool:
+        with self.__lock:
+            new = address not in self.__seen
+            self.__seen[address] = time.monotonic()
+        return new
+
+    def remove(self, address) -> None:
+        with self.__lock:
+            self.__seen.pop(address, None)
+
+    def expire(self) -> list:
+        """
+        Удаляет подписчиков с истекшей подпиской
+        :return: удаленные адреса
+        """
+        if not self.ttl:
+            return []
+        deadline = time.monotonic() - self.ttl
+        with self.__lock:
+            expired = [address for address, seen in self.__seen.items() if seen < deadline]
+            for address in expired:
+                del self.__seen[address]
+        return expired
+
+    def addresses(self) -> list:
+        """Адреса действующих подписчиков"""
+        self.expire()
+        with self.__lock:
+            return list(self.__seen)
+
+    def __len__(self):
+        return len(self.__seen)
+
+    def __contains__(self, address):
+        return address in self.__seen
+
+    def __repr__(self):
+        return f"Subscribers: {list(self.__seen)} ttl : {self.ttl}"
+
+    def __str__(self):
+        return f"Subscribers: {list(self.__seen)} ttl : {self.ttl}"
+
+
 class Architect:
-    def __init__(self, port: int, client_ip: str, off_button, message_button, size: int = 1024):
+    def __init__(self, port: int, client_ip: str, off_button, message_button, size: int = 1024, ip: str = None,
+                 binary: bool = False, lines: int = 1, ttl: float = 60.0, group: str = None, group_port: int = None,
+                 reliable: bool = False, sync: float = 0):
+        """
+        :param port: порт сервера
+        :param client_ip: адрес, на который дополнительно отправляется команда отключения, None -- только подписчикам
+        :param off_button: SYSFSID/GPIO линия кнопки выключения
+        :param message_button: SYSFSID/GPIO линия кнопки, нажатие которой переключает светодиоды клиента
+        :param size: размер буфера приема
+        :param ip: адрес сервера, по умолчанию -- адрес внешнего интерфейса
+        :param binary: отправлять команды в двоичном формате (protocol) вместо текстового
+        :param lines: количество светодиодов клиента, которые переключаются одним пакетом в двоичном формате
+        :param ttl: время жизни подписки клиента без пакетов от него (см. Subscribers)
+        :param group: адрес группы UDP multicast; если задан -- каждый пакет отправляется один раз в группу вместо
+        рассылки подписчикам
+        :param group_port: порт группы, по умолчанию -- порт сервера
+        :param reliable: подтверждаемая доставка нажатий (protocol.Retransmitter), включает двоичный формат
+        :param sync: синхронизация состояния, включает двоичный формат: сервер хранит состояние светодиодов, нажатие
+        рассылает изменения (OP_SET), раз в sync секунд и новому подписчику сразу отправляется снимок состояния
+        (OP_SNAPSHOT). 0 -- команды переключения (OP_SWITCH)
+        """
+        self.binary = binary or reliable or bool(sync)
+        self.sync = sync
+        # Состояние светодиодов клиента в режиме синхронизации, бит i -- линия i
+        self.state = 0
+        self.lock = threading.RLock()
+        self.lines = lines
+        # Случайный начальный номер, чтобы клиенты не отбросили пакеты перезапущенного сервера как повторные
+        self.sequence = random.getrandbits(32)
+        self.delivery = protocol.Retransmitter() if reliable else None
         self.client_ip = client_ip
         self.size = size
-        self.ip = get_ip()
+        self.ip = ip if ip is not None else get_ip()
         self.port = port
         self.power_on = True
         self.off_button = gpio.Button(off_button, 'rising')
         self.message_button = gpio.Button(message_button, 'rising')
+        # Обе кнопки обслуживаются одним потоком через общий epoll
+        self.buttons = gpio.ButtonMultiplexer()
+        self.buttons.add(self.off_button, self.power_off)
+        self.buttons.add(self.message_button, self.message)
+        self.subscribers = Subscribers(ttl)
+        self.group = group
+        self.group_port = port if group_port is None else group_port
         self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
+    def multicast(self, sock) -> None:
+        """Настраивает сокет для отправки в группу multicast через интерфейс сервера"""
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.ip))
+
+    def subscribe(self, data, address, send) -> None:
+        """
+        Обрабатывает пакет клиента: подписка, продление или отмена подписки, подтверждение получения
+        :param send: sendto сокета или транспорта asyncio для снимка состояния новому подписчику
+        """
+        if self.delivery is not None and protocol.is_binary(data):
+            try:
+                sequence, commands = protocol.decode(data)
+            except ValueError:
+                return
+            if any(command.op == protocol.OP_ACK for command in commands):
+                self.delivery.ack(address, sequence)
+        if self.subscribers.update(data, address):
+            print(f"{data} {address}")
+            if self.sync:
+                send(self.packet(protocol.OP_SNAPSHOT), address)
+
+    def retransmit(self, send) -> None:
+        """Повторяет пакеты без подтверждения, время повтора которых наступило"""
+        for data, address in self.delivery.due():
+            if address in self.subscribers:
+                send(data, address)
+            else:
+                self.delivery.forget(address)
+
+    def listen(self):
+        """Прием пакетов клиентов до выключения сервера"""
+        self.server.settimeout(0.5)
+        snapshot = time.monotonic() + self.sync
+        while self.power_on:
+            self.subscribers.expire()
+            timeout = 0.5
+            if self.delivery is not None:
+                self.retransmit(self.server.sendto)
+                timeout = self.delivery.timeout()
+            if self.sync:
+                now = time.monotonic()
+                if now >= snapshot:
+                    self.broadcast(self.packet(protocol.OP_SNAPSHOT), self.server.sendto)
+                    snapshot = now + self.sync
+                timeout = min(timeout, snapshot - now)
+            self.server.settimeout(timeout)
+            try:
+                data, address = self.server.recvfrom(self.size)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.subscribe(data, address, self.server.sendto)
+
+    def broadcast(self, data: bytes, send) -> int:
+        """
+        Отправляет пакет всем подписчикам за один проход (пакет собирается один раз) или один раз в группу multicast
+        :param send: sendto сокета или транспорта asyncio
+        :return: количество отправленных пакетов
+        """
+        if self.group is not None:
+            send(data, (self.group, self.group_port))
+            return 1
+        addresses = self.subscribers.addresses()
+        for address in addresses:
+            send(data, address)
+        return len(addresses)
+
+    def deliver(self, op: int, send) -> None:
+        """
+        Рассылает команду. При подтверждаемой доставке пакет регистрируется для повтора у каждого подписчика до
+        отправки -- первая отправка выполняется сразу, повторы выполняет listen() (retransmits() в режиме asyncio)
+        """
+        with self.lock:
+            data = self.packet(op)
+            sequence = self.sequence
+        if self.delivery is not None:
+            for address in self.subscribers.addresses():
+                self.delivery.sent(address, sequence, data)
+        self.broadcast(data, send)
+
     def work(self):
         self.server.bind((self.ip, self.port))
-        data, client = self.server.recvfrom(self.size)
-        print(f"{data} {client}")
+        if self.group is not None:
+            self.multicast(self.server)
+        listener = threading.Thread(target=self.listen, daemon=True)
+        listener.start()
         print("server waiting!")
-        with self.message_button:
-            while self.power_on:
-                if self.message_button.click():
-                    print('click!')
-                    self.server.sendto(b'1', client)
+        with self.buttons:
+            self.buttons.run()
+        listener.join()
         self.server.close()
         print("server off")
 
-    def power_off(self):
-        with self.off_button:
-            if self.off_button.click():
-                self.power_on = False
-                self.server.sendto(b'0', (self.client_ip, self.port))
-                print("power button off")
+    def packet(self, op: int) -> bytes:
+        """
+        Пакет для клиента: переключение светодиодов (OP_SWITCH), отключение (OP_STOP) или снимок состояния
+        (OP_SNAPSHOT). В режиме синхронизации переключение изменяет состояние и рассылается как OP_SET
+        """
+        if not self.binary:
+            return b'1' if op == protocol.OP_SWITCH else b'0'
+        with self.lock:
+            self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+            if op == protocol.OP_SNAPSHOT:
+                return protocol.snapshot(self.sequence, self.state, self.lines)
+            if op == protocol.OP_SWITCH and self.sync:
+                self.state ^= (1 << self.lines) - 1
+                return protocol.encode(self.sequence, [(line, protocol.OP_SET, (self.state >> line) & 1)
+                                                       for line in range(self.lines)])
+            return protocol.encode(self.sequence, [(line, op, 0) for line in range(self.lines)])
+
+    def message(self, button, value):
+        print('click!')
+        self.deliver(protocol.OP_SWITCH, self.server.sendto)
+
+    def stop_clients(self, send) -> None:
+        """Отправляет команду отключения подписчикам (или в группу) и по адресу client_ip"""
+        data = self.packet(protocol.OP_STOP)
+        self.broadcast(data, send)
+        if self.client_ip is not None:
+            send(data, (self.client_ip, self.port))
+
+    def power_off(self, button, value):
+        self.power_on = False
+        self.buttons.stop()
+        self.stop_clients(self.server.sendto)
+        print("power button off")
 
     def start(self):
         try:
-            work_stream = threading.Thread(target=self.work)
-            button_stream = threading.Thread(target=self.power_off)
-            work_stream.start()
-            button_stream.start()
-            work_stream.join()
-            button_stream.join()
+            self.work()
         except:
-            self.off_button.close(off_value=False)
-            self.message_button.close(off_value=False)
+            self.buttons.close()
             self.server.close()
 
+    async def serve(self):
+        """
+        Работа сервера в цикле событий asyncio: пакеты клиентов обрабатываются ButtonProtocol, нажатия кнопок
+        ожидаются через Button.wait_edge/edges без отдельных потоков
+        """
+        self.server.close()
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: ButtonProtocol(self),
+                                                           local_addr=(self.ip, self.port))
+        if self.group is not None:
+            self.multicast(transport.get_extra_info('socket'))
+        print("server waiting!")
+        try:
+            with self.off_button, self.message_button:
+                tasks = [asyncio.ensure_future(self.messages(transport))]
+                if self.delivery is not None:
+                    tasks.append(asyncio.ensure_future(self.retransmits(transport)))
+                if self.sync:
+                    tasks.append(asyncio.ensure_future(self.snapshots(transport)))
+                try:
+                    while self.power_on:
+                        if await self.off_button.wait_edge():
+                            self.power_on = False
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                self.stop_clients(transport.sendto)
+                print("power button off")
+        finally:
+            transport.close()
+        print("server off")
+
+    async def messages(self, transport):
+        async for _ in self.message_button.edges():
+            print('click!')
+            self.deliver(protocol.OP_SWITCH, transport.sendto)
+
+    async def retransmits(self, transport):
+        while True:
+            self.retransmit(transport.sendto)
+            await asyncio.sleep(self.delivery.timeout())
+
+    async def snapshots(self, transport):
+        while True:
+            await asyncio.sleep(self.sync)
+            self.broadcast(self.packet(protocol.OP_SNAPSHOT), transport.sendto)
+
+
+class ButtonProtocol(asyncio.DatagramProtocol):
+    """Подписка клиентов Architect в режиме asyncio"""
+    def __init__(self, architect: Architect):
+        self.architect = architect
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.architect.subscribe(data, addr, self.transport.sendto)
+
 
 if __name__ == '__main__':
     args = argparse.ArgumentParser()
     args.add_argument('-p', '--port', type=int)
     args.add_argument('-f', '--off', type=int)
     args.add_argument('-m', '--message', type=int)
-    args.add_argument('-c', '--client', type=str)
+    # -c адрес, на который дополнительно отправляется команда отключения
+    args.add_argument('-c', '--client', type=str, default=None)
+    # -a работа в цикле событий asyncio вместо потоков
+    args.add_argument('-a', '--asyncio', action='store_true')
+    # --binary команды в двоичном формате, -n количество светодиодов клиента
+    args.add_argument('--binary', action='store_true')
+    args.add_argument('-n', '--lines', type=int, default=1)
+    # -t время жизни подписки клиента без пакетов в секундах (0 -- без ограничения)
+    args.add_argument('-t', '--ttl', type=float, default=60.0)
+    # -g адрес группы multicast, --group-port ее порт (по умолчанию -- порт сервера)
+    args.add_argument('-g', '--group', type=str, default=None)
+    args.add_argument('--group-port', type=int, default=None)
+    # -r подтверждаемая доставка с повтором пакетов (включает --binary)
+    args.add_argument('-r', '--reliable', action='store_true')
+    # -s период отправки снимка состояния в секундах в режиме синхронизации (включает --binary)
+    args.add_argument('-s', '--sync', type=float, default=0)
     values = args.parse_args(sys.argv[1:])
-    stream = Architect(values.port, values.client, values.off, values.message)
-    stream.start()
+    stream = Architect(values.port, values.client, values.off, values.message, binary=values.binary,
+                       lines=values.lines, ttl=values.ttl, group=values.group, group_port=values.group_port,
+                       reliable=values.reliable, sync=values.sync)
+    if values.asyncio:
+        asyncio.run(stream.serve())
+    else:
+        stream.start()
@@ -1,15 +1,39 @@
 import socket
 import argparse
 import sys
+import json
+import select
+import time
+import protocol
 
 
 class Client:
-    def __init__(self, ip: int, port: int, size: int = 1024):
+    def __init__(self, ip: int, port: int, size: int = 1024, binary: bool = False):
+        """
+        :param binary: отправлять числа в двоичном формате (protocol) вместо текстового
+        """
         self.size = size
         self.ip = ip
         self.port = port
+        self.binary = binary
+        self.sequence = 0
         self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
+    def encode(self, number: int) -> bytes:
+        if not self.binary:
+            return str(number).encode('utf-8')
+        self.sequence += 1
+        if number == -1:
+            return protocol.encode(self.sequence, [(0, protocol.OP_STOP, 0)])
+        return protocol.encode(self.sequence, [(0, protocol.OP_DATA, number)])
+
+    @staticmethod
+    def stopped(data) -> bool:
+        """Проверяет, является ли ответ сервера командой отключения"""
+        if protocol.is_binary(data):
+            return any(command.op == protocol.OP_STOP for command in protocol.decode(data)[1])
+        return int(data.decode("utf-8")) == -1
+
     def start(self):
         with self.client as c:
             while True:
@@ -22,15 +46,141 @@ class Client:
                             print("Invalid value!")
                     except ValueError:
                         print("Invalid value!")
-                c.sendto(message.encode('utf-8'), (self.ip, self.port))
-                if int(c.recv(self.size).decode("utf-8")) == -1:
+                c.sendto(self.encode(int(message)), (self.ip, self.port))
+                if self.stopped(c.recv(self.size)):
                     break
 
 
+def percentile(ordered: list, q: float):
+    """Перцентиль q (0..1) отсортированного списка, None для пустого"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoadGenerator:
+    """
+    Нагрузочный режим без ввода с клавиатуры: несколько виртуальных клиентов (сокетов) в одном потоке отправляют
+    запросы в двоичном формате (protocol) с заданной общей частотой, держа у каждого клиента до window запросов без
+    ответа. Ответы сопоставляются с запросами по номеру пакета; запросы без ответа дольше timeout считаются потерянными.
+    """
+    def __init__(self, ip: str, port: int, clients: int = 16, rate: float = 0, window: int = 8,
+                 duration: float = 10, timeout: float = 1.0, size: int = 1024):
+        """
+        :param clients: количество виртуальных клиентов
+        :param rate: общая частота запросов в секунду, 0 -- максимально возможная при заданном window
+        :param window: максимальное количество запросов без ответа у одного клиента
+        :param duration: длительность отправки запросов в секундах
+        :param timeout: время ожидания ответа, после которого запрос считается потерянным
+        """
+        self.ip = ip
+        self.port = port
+        self.clients = clients
+        self.rate = rate
+        self.window = window
+        self.duration = duration
+        self.timeout = timeout
+        self.size = size
+
+    def run(self) -> dict:
+        """
+        Выполняет нагрузку
+        :return: количество отправленных, полученных и потерянных запросов, достигнутая частота и задержки в мкс
+        """
+        sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(self.clients)]
+        # Для каждого клиента: номер пакета -> время отправки
+        pending = [{} for _ in sockets]
+        indexes = {}
+        rtts = []
+        sent = lost = sequence = 0
+        timeout = int(self.timeout * 1e9)
+        interval = int(1e9 / self.rate) if self.rate else 0
+        with select.epoll() as poller:
+            try:
+                for i, sock in enumerate(sockets):
+                    sock.setblocking(False)
+                    sock.connect((self.ip, self.port))
+                    poller.register(sock.fileno(), select.EPOLLIN)
+                    indexes[sock.fileno()] = i
+                start = time.monotonic_ns()
+                end = start + int(self.duration * 1e9)
+                next_send = expire = start
+                turn = 0
+                while True:
+                    now = time.monotonic_ns()
+                    sending = now < end
+                    while sending and (not interval or next_send <= now):
+                        for shift in range(self.clients):
+                            i = (turn + shift) % self.clients
+                            if len(pending[i]) < self.window:
+                                break
+                        else:
+                            # Все окна заполнены -- отставание от расписания не накапливается
+                            next_send = now
+                            break
+                        sequence += 1
+                        sockets[i].send(protocol.encode(sequence, [(0, protocol.OP_DATA, 1)]))
+                        pending[i][sequence] = time.monotonic_ns()
+                        sent += 1
+                        next_send += interval
+                        turn = i + 1
+                    if now >= expire:
+                        expire = now + 10000000
+                        for requests in pending:
+                            for number in [n for n, t in requests.items() if now - t > timeout]:
+                                del requests[number]
+                                lost += 1
+                    if not sending and not any(pending):
+                        break
+                    wait = (next_send - now) / 1e9 if sending and interval else 0.01
+                    for fd, _ in poller.poll(max(0.0, min(wait, 0.01))):
+                        i = indexes[fd]
+                        while True:
+                            try:
+                                data = sockets[i].recv(self.size)
+                            except (BlockingIOError, ConnectionRefusedError):
+                                break
+                            received = time.monotonic_ns()
+                            if protocol.is_binary(data):
+                                number = protocol.decode(data)[0]
+                                started = pending[i].pop(number, None)
+                                if started is not None:
+                                    rtts.append(received - started)
+                elapsed = (time.monotonic_ns() - start) / 1e9
+            finally:
+                for sock in sockets:
+                    sock.close()
+        rtts.sort()
+        return {'clients': self.clients,
+                'window': self.window,
+                'target_rate': self.rate,
+                'sent': sent,
+                'received': len(rtts),
+                'lost': lost,
+                'loss': lost / sent if sent else 0.0,
+                'rate': len(rtts) / elapsed if elapsed else 0.0,
+                'p50_us': percentile(rtts, 0.5) / 1000 if rtts else None,
+                'p99_us': percentile(rtts, 0.99) / 1000 if rtts else None,
+                'p999_us': percentile(rtts, 0.999) / 1000 if rtts else None}
+
+
 if __name__ == '__main__':
     args = argparse.ArgumentParser()
     args.add_argument('-p', '--port', type=int)
     args.add_argument('-i', '--ip', type=str)
+    # --binary числа в двоичном формате
+    args.add_argument('--binary', action='store_true')
+    # --load нагрузочный режим: -c виртуальных клиентов, -r запросов в секунду (0 -- без ограничения),
+    # -w запросов без ответа на клиента, -d длительность в секундах
+    args.add_argument('--load', action='store_true')
+    args.add_argument('-c', '--clients', type=int, default=16)
+    args.add_argument('-r', '--rate', type=float, default=0)
+    args.add_argument('-w', '--window', type=int, default=8)
+    args.add_argument('-d', '--duration', type=float, default=10)
     values = args.parse_args(sys.argv[1:])
-    orange = Client(values.ip, values.port)
-    orange.start()
+    if values.load:
+        generator = LoadGenerator(values.ip, values.port, values.clients, values.rate, values.window, values.duration)
+        print(json.dumps(generator.run(), indent=2))
+    else:
+        orange = Client(values.ip, values.port, binary=values.binary)
+        orange.start()
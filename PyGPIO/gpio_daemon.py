@@ -0,0 +1,545 @@
+import pygpiolib as gpio
+import pinmap
+import asyncio
+import collections
+import mmap
+import os
+import select
+import socket
+import struct
+import time
+import argparse
+import sys
+
+SOCKET = "/tmp/pygpio.sock"
+STATE = "/dev/shm/pygpio-state"
+
+# Сообщение между клиентом и демоном (SOCK_SEQPACKET, одно сообщение -- одна структура):
+# операция, линия, значение, время события по time.monotonic
+MESSAGE = struct.Struct("=BIBd")
+
+OP_OUTPUT = 1       # открыть линию на выход
+OP_INPUT = 2        # открыть линию на вход и подписаться на события, value -- индекс edge в EDGES
+OP_WRITE = 3        # записать значение линии (без ответа)
+OP_REPLY = 4        # ответ демона: value 0 -- успешно, 1 -- ошибка
+OP_EVENT = 5        # событие на линии подписки
+
+EDGES = ('none', 'rising', 'falling', 'both')
+
+
+class State:
+    """
+    Битовая карта состояния линий в общей памяти (файл в /dev/shm, отображенный mmap): бит i -- значение линии i.
+    Демон создает карту и обновляет ее при записи и событиях, клиенты отображают ее только для чтения и считывают
+    значения без системных вызовов.
+    """
+    HEADER = struct.Struct("=4sI")
+    MAGIC = b'PGST'
+
+    def __init__(self, path: str = STATE, ngpio: int = 1024):
+        self.path = path
+        self.ngpio = ngpio
+        self.map = None
+        # (устройство, inode) отображенного файла: демон при перезапуске создает карту заново
+        self.inode = None
+
+    def create(self) -> None:
+        """Создает карту (демон)"""
+        size = self.HEADER.size + (self.ngpio + 7) // 8
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.HEADER.pack_into(self.map, 0, self.MAGIC, self.ngpio)
+
+    def attach(self) -> None:
+        """Отображает карту, созданную демоном, только для чтения (клиент)"""
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            self.map = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(fd)
+            self.inode = stat.st_dev, stat.st_ino
+        finally:
+            os.close(fd)
+        magic, self.ngpio = self.HEADER.unpack_from(self.map)
+        if magic != self.MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} не является картой состояния линий!")
+
+    def stale(self) -> bool:
+        """True если файл карты удален или создан заново после attach() (демон перезапущен)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_dev, stat.st_ino) != self.inode
+
+    def get(self, gpio_line: int) -> int:
+        return (self.map[self.HEADER.size + (gpio_line >> 3)] >> (gpio_line & 7)) & 1
+
+    def set(self, gpio_line: int, value: int) -> None:
+        index = self.HEADER.size + (gpio_line >> 3)
+        if value:
+            self.map[index] |= 1 << (gpio_line & 7)
+        else:
+            self.map[index] &= ~(1 << (gpio_line & 7)) & 0xFF
+
+    def close(self, unlink: bool = False) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if unlink:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __repr__(self):
+        return f"State: {self.path} ngpio : {self.ngpio}"
+
+    def __str__(self):
+        return f"State: {self.path} ngpio : {self.ngpio}"
+
+
+class Daemon:
+    """
+    Процесс, которому принадлежат все линии. Линии открываются один раз -- при первом запросе клиента или при запуске
+    по описанию платы (pinmap) -- и остаются открытыми (cached) до остановки демона, поэтому клиенты не платят за
+    экспорт и не конфликтуют из-за линий. Клиенты (LedProxy, ButtonProxy) подключаются через Unix socket; записи и
+    события обслуживаются одним потоком через epoll, значения линий публикуются в State.
+        with Daemon() as daemon:
+            daemon.run()
+    """
+    def __init__(self, path: str = SOCKET, state: str = STATE, ngpio: int = 1024, config=None):
+        """
+        :param path: путь Unix socket
+        :param state: путь карты состояния в общей памяти
+        :param config: описание платы для pinmap.PinMap, линии которого открываются при запуске
+        """
+        self.path = path
+        self.state = State(state, ngpio)
+        self.board = pinmap.PinMap(config) if config is not None else None
+        if self.board is not None:
+            # Входы открываются с edge both, как и по запросу клиента: подписки фильтруются демоном
+            self.board.pins = [pin._replace(edge='both') if pin.direction == 'in' else pin for pin in self.board.pins]
+        self.power_on = True
+        self.leds = {}
+        self.buttons = {}
+        # Событий, не доставленных из-за переполнения буфера сокета клиента
+        self.dropped = 0
+        # Записей OP_WRITE и считываний событий на линиях, завершившихся ошибкой (ответ на запись не отправляется)
+        self.errors = 0
+        self.epoll = None
+        self.listener = None
+        self.__clients = {}
+        self.__watches = {}
+        # gpio_line -> {дескриптор клиента: edge подписки}
+        self.__subscribers = collections.defaultdict(dict)
+        self.__wake_reader, self.__wake_writer = None, None
+
+    def open(self):
+        self.power_on = True
+        self.state.create()
+        self.epoll = select.epoll()
+        self.__wake_reader, self.__wake_writer = os.pipe()
+        self.epoll.register(self.__wake_reader, select.EPOLLIN)
+        try:
+            if self.board is not None:
+                self.board.open()
+                for pin in self.board.pins:
+                    handle = self.board[pin.name]
+                    if pin.direction == 'out':
+                        self.leds[pin.line] = handle
+                        self.state.set(pin.line, handle.value)
+                    else:
+                        self.__watch(handle)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self.listener.bind(self.path)
+            self.listener.listen(64)
+            self.listener.setblocking(False)
+            self.epoll.register(self.listener.fileno(), select.EPOLLIN)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        for fd in list(self.__clients):
+            self.__drop(fd)
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            os.unlink(self.path)
+        board = set(self.board.handles.values()) if self.board is not None else set()
+        for handle in list(self.leds.values()) + list(self.buttons.values()):
+            if handle in board:
+                continue
+            if isinstance(handle, gpio.Led):
+                handle.close(True)
+            else:
+                handle.close()
+        if self.board is not None:
+            self.board.close()
+        self.leds.clear()
+        self.buttons.clear()
+        self.__watches.clear()
+        self.__subscribers.clear()
+        if self.epoll is not None:
+            self.epoll.close()
+            os.close(self.__wake_reader)
+            os.close(self.__wake_writer)
+            self.epoll = None
+        self.state.close(unlink=True)
+
+    def __watch(self, button):
+        fd, mask = gpio.backend.watch(button.gpio_line, button.fd)
+        self.epoll.register(fd, mask | select.EPOLLERR)
+        self.__watches[fd] = button
+        self.buttons[button.gpio_line] = button
+        self.state.set(button.gpio_line, button.read())
+
+    def __check(self, gpio_line):
+        if not 0 <= gpio_line < self.state.ngpio:
+            raise ValueError(f"Линия {gpio_line} вне карты состояния!")
+
+    def output(self, gpio_line: int) -> gpio.Led:
+        """Светодиод линии, при первом обращении линия открывается на выход"""
+        led = self.leds.get(gpio_line)
+        if led is None:
+            self.__check(gpio_line)
+            if gpio_line in self.buttons:
+                raise ValueError(f"Линия {gpio_line} открыта на вход!")
+            led = gpio.Led(gpio_line, cached=True)
+            led.open('out')
+            self.leds[gpio_line] = led
+            self.state.set(gpio_line, 0)
+        return led
+
+    def input(self, gpio_line: int) -> gpio.Button:
+        """Кнопка линии, при первом обращении линия открывается на вход с edge both (подписки фильтруются демоном)"""
+        button = self.buttons.get(gpio_line)
+        if button is None:
+            self.__check(gpio_line)
+            if gpio_line in self.leds:
+                raise ValueError(f"Линия {gpio_line} открыта на выход!")
+            button = gpio.Button(gpio_line, 'both', cached=True)
+            button.open('in', 'both')
+            self.__watch(button)
+        return button
+
+    def __drop(self, fd):
+        self.epoll.unregister(fd)
+        self.__clients.pop(fd).close()
+        for subscribers in self.__subscribers.values():
+            subscribers.pop(fd, None)
+
+    def __reply(self, fd, gpio_line, error):
+        try:
+            self.__clients[fd].send(MESSAGE.pack(OP_REPLY, gpio_line, int(error), 0.0))
+        except OSError:
+            # Клиент отключился, не дождавшись ответа
+            self.__drop(fd)
+
+    def __request(self, fd, data):
+        op, gpio_line, value, _ = MESSAGE.unpack(data)
+        if op == OP_WRITE:
+            led = self.leds.get(gpio_line)
+            if led is not None and value in (0, 1):
+                try:
+                    led.value = value
+                except OSError:
+                    self.errors += 1
+                else:
+                    self.state.set(gpio_line, value)
+            return
+        try:
+            if op == OP_OUTPUT:
+                self.output(gpio_line)
+            elif op == OP_INPUT:
+                self.input(gpio_line)
+                self.__subscribers[gpio_line][fd] = EDGES[value]
+            else:
+                raise ValueError
+        except (ValueError, OSError):
+            self.__reply(fd, gpio_line, True)
+        else:
+            self.__reply(fd, gpio_line, False)
+
+    def __edge(self, button):
+        gpio_line = button.gpio_line
+        try:
+            edge = button.acknowledge()
+        except (ValueError, OSError):
+            self.errors += 1
+            return
+        if edge is None:
+            return
+        timestamp, value = edge
+        self.state.set(gpio_line, value)
+        message = MESSAGE.pack(OP_EVENT, gpio_line, value, timestamp)
+        fired = 'rising' if value else 'falling'
+        failed = []
+        for fd, edge in self.__subscribers[gpio_line].items():
+            if edge == 'both' or edge == fired:
+                try:
+                    self.__clients[fd].send(message)
+                except BlockingIOError:
+                    self.dropped += 1
+                except OSError:
+                    # Клиент отключился, а событие отключения еще не обработано
+                    failed.append(fd)
+        for fd in failed:
+            self.__drop(fd)
+
+    def poll(self, timeout: float = None) -> None:
+        """Обрабатывает подключения, запросы клиентов и события на линиях"""
+        for fd, mask in self.epoll.poll(-1 if timeout is None else timeout):
+            if fd == self.__wake_reader:
+                os.read(fd, 64)
+            elif self.listener is not None and fd == self.listener.fileno():
+                try:
+                    client, _ = self.listener.accept()
+                except BlockingIOError:
+                    continue
+                client.setblocking(False)
+                self.__clients[client.fileno()] = client
+                self.epoll.register(client.fileno(), select.EPOLLIN)
+            elif fd in self.__watches:
+                self.__edge(self.__watches[fd])
+            elif fd in self.__clients:
+                while fd in self.__clients:
+                    try:
+                        data = self.__clients[fd].recv(MESSAGE.size)
+                    except BlockingIOError:
+                        break
+                    except OSError:
+                        data = b''
+                    if len(data) != MESSAGE.size:
+                        self.__drop(fd)
+                        break
+                    self.__request(fd, data)
+
+    def run(self) -> None:
+        """Обработка до вызова stop()"""
+        while self.power_on:
+            self.poll()
+
+    def stop(self) -> None:
+        """Останавливает run(). Может вызываться из другого потока или из обработчика сигнала."""
+        self.power_on = False
+        if self.__wake_writer is not None:
+            os.write(self.__wake_writer, b'\0')
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"Daemon: {self.path} outputs : {sorted(self.leds)} inputs : {sorted(self.buttons)}"
+
+    def __str__(self):
+        return f"Daemon: {self.path} outputs : {sorted(self.leds)} inputs : {sorted(self.buttons)}"
+
+
+# Карты состояния, уже отображенные в этом процессе: путь -> State
+states = {}
+
+
+def shared(path: str = STATE, reattach: bool = False) -> State:
+    """
+    Карта состояния демона, отображенная один раз на процесс
+    :param reattach: отобразить карту заново, если демон пересоздал файл (вызывается при подключении к демону)
+    """
+    state = states.get(path)
+    if state is not None and reattach and state.stale():
+        state.close()
+        state = None
+    if state is None:
+        state = State(path)
+        state.attach()
+        states[path] = state
+    return state
+
+
+def connect(path: str, op: int, gpio_line: int, value: int = 0) -> socket.socket:
+    """Подключается к демону и открывает линию"""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    try:
+        client.connect(path)
+        client.send(MESSAGE.pack(op, gpio_line, value, 0.0))
+        reply_op, _, error, _ = MESSAGE.unpack(client.recv(MESSAGE.size))
+        if reply_op != OP_REPLY or error:
+            raise ValueError(f"Линия {gpio_line} недоступна!")
+    except Exception:
+        client.close()
+        raise
+    return client
+
+
+class LedProxy(gpio.Led):
+    """
+    Светодиод линии, принадлежащей демону. Интерфейс Led: value, switch(), with; запись -- одно сообщение демону без
+    ожидания ответа. read() -- значение линии из общей памяти без системных вызовов.
+    """
+    def __init__(self, gpio_line: int, path: str = SOCKET, state: str = STATE):
+        super().__init__(gpio_line, cached=True)
+        self.socket_path = path
+        self.state_path = state
+        self.client = None
+
+    @property
+    def value(self):
+        return gpio.Led.value.fget(self)
+
+    @value.setter
+    def value(self, var):
+        if var not in [0, 1]:
+            raise ValueError("Недопустимое значение состояния светодиода!")
+        self.update(var)
+        self.client.send(MESSAGE.pack(OP_WRITE, self.gpio_line, var, 0.0))
+
+    def read(self) -> int:
+        return shared(self.state_path).get(self.gpio_line)
+
+    def open(self, direction='out', edge=None):
+        self.client = connect(self.socket_path, OP_OUTPUT, self.gpio_line)
+        shared(self.state_path, reattach=True)
+        self.opened = True
+        self.update(self.read())
+
+    def close(self, off_value=False):
+        """Отключается от демона, линия остается открытой демоном; если off_value -- светодиод выключается"""
+        if self.client is not None:
+            if off_value:
+                self.value = 0
+            self.client.close()
+            self.client = None
+            self.opened = False
+
+
+class ButtonProxy(gpio.Button):
+    """
+    Кнопка линии, принадлежащей демону. Интерфейс Button: click(), wait_edge(), edges(), accept() с фильтром
+    дребезга, events, with; кнопку можно передавать в ButtonMultiplexer. События приходят от демона по подписке через
+    сокет, дескриптор которого -- fd кнопки; read() -- значение линии из общей памяти без системных вызовов.
+    """
+    def __init__(self, gpio_line, edge: str = "both", debounce: float = 0, history: int = 64, path: str = SOCKET,
+                 state: str = STATE):
+        super().__init__(gpio_line, edge, cached=True, debounce=debounce, history=history)
+        self.socket_path = path
+        self.state_path = state
+        self.client = None
+
+    def open(self, direction='in', edge=None):
+        self.client = connect(self.socket_path, OP_INPUT, self.gpio_line, EDGES.index(edge or self.edge))
+        shared(self.state_path, reattach=True)
+        self.fd = self.client.fileno()
+        self.opened = True
+
+    def close(self, off_value=False):
+        """Отключается от демона, линия остается открытой демоном"""
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.fd = None
+            self.opened = False
+
+    def read(self) -> int:
+        return shared(self.state_path).get(self.gpio_line)
+
+    def watch(self) -> tuple:
+        return self.fd, select.EPOLLIN
+
+    def acknowledge(self) -> gpio.Edge:
+        """
+        Принимает сообщение демона
+        :return: событие; None -- сообщение не является событием
+        """
+        data = self.client.recv(MESSAGE.size)
+        if not data:
+            raise ConnectionError("Демон GPIO остановлен!")
+        op, _, value, timestamp = MESSAGE.unpack(data)
+        return gpio.Edge(timestamp, value) if op == OP_EVENT else None
+
+    def click(self, timeout: float = None) -> bool:
+        """
+        Ожидание события от демона
+        :param timeout: время ожидания в секундах, None -- без ограничения
+        :return: True если кнопка нажата, False если кнопка не нажата в течение timeout секунд
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self.client.settimeout(remaining)
+                edge = self.acknowledge()
+                if edge is not None and self.accept(edge.value, edge.timestamp):
+                    return True
+        except socket.timeout:
+            return False
+        finally:
+            self.client.settimeout(None)
+
+    def __on_event(self, future):
+        if future.done():
+            return
+        try:
+            edge = self.acknowledge()
+        except ConnectionError as exc:
+            future.set_exception(exc)
+            return
+        if edge is not None and self.accept(edge.value, edge.timestamp):
+            future.set_result(edge.value)
+
+    async def __event(self, timeout):
+        # Сокет демона ожидается циклом событий напрямую: файл value и epoll кнопки (Button) не используются
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        loop.add_reader(self.fd, self.__on_event, future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            loop.remove_reader(self.fd)
+
+    async def wait_edge(self, timeout: float = None) -> bool:
+        """
+        Ожидание события от демона в цикле событий asyncio
+        :param timeout: время ожидания в секундах, None -- без ограничения
+        :return: True если кнопка нажата, False если время ожидания истекло
+        """
+        return await self.__event(timeout) is not None
+
+    async def edges(self):
+        """
+        Асинхронный поток событий от демона: значение линии при каждом событии
+            async for value in button.edges(): ...
+        """
+        while True:
+            yield await self.__event(None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    # -s путь Unix socket, --state путь карты состояния в общей памяти
+    parser.add_argument('-s', '--socket', type=str, default=SOCKET)
+    parser.add_argument('--state', type=str, default=STATE)
+    # --pins описание платы (pinmap), линии которого открываются при запуске
+    parser.add_argument('--pins', type=str, default=None)
+    arg = parser.parse_args(sys.argv[1:])
+    daemon = Daemon(arg.socket, arg.state, config=arg.pins)
+    with daemon:
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,261 @@
+import pygpiolib as gpio
+import fcntl
+import os
+import select
+import struct
+
+# Константы GPIO character device uAPI v2 (linux/gpio.h)
+GPIO_V2_LINES_MAX = 64
+GPIO_V2_LINE_NUM_ATTRS_MAX = 10
+
+GPIO_V2_LINE_FLAG_ACTIVE_LOW = 1 << 1
+GPIO_V2_LINE_FLAG_INPUT = 1 << 2
+GPIO_V2_LINE_FLAG_OUTPUT = 1 << 3
+GPIO_V2_LINE_FLAG_EDGE_RISING = 1 << 4
+GPIO_V2_LINE_FLAG_EDGE_FALLING = 1 << 5
+
+GPIO_V2_LINE_ATTR_ID_FLAGS = 1
+GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES = 2
+GPIO_V2_LINE_ATTR_ID_DEBOUNCE = 3
+
+GPIO_V2_LINE_EVENT_RISING_EDGE = 1
+GPIO_V2_LINE_EVENT_FALLING_EDGE = 2
+
+# struct gpio_v2_line_request: offsets[64], consumer[32], gpio_v2_line_config (flags, num_attrs, padding[5],
+# attrs[10] -- gpio_v2_line_config_attribute: id, padding, value, mask), num_lines, event_buffer_size, padding[5], fd
+LINE_REQUEST = struct.Struct("=64I32sQI20x" + "IIQQ" * GPIO_V2_LINE_NUM_ATTRS_MAX + "II20xi")
+# struct gpio_v2_line_values: bits, mask
+LINE_VALUES = struct.Struct("=QQ")
+# struct gpio_v2_line_event: timestamp_ns, id, offset, seqno, line_seqno, padding[6]
+LINE_EVENT = struct.Struct("=QIIII24x")
+
+EDGE_FLAGS = {
+    None: 0,
+    'none': 0,
+    'rising': GPIO_V2_LINE_FLAG_EDGE_RISING,
+    'falling': GPIO_V2_LINE_FLAG_EDGE_FALLING,
+    'both': GPIO_V2_LINE_FLAG_EDGE_RISING | GPIO_V2_LINE_FLAG_EDGE_FALLING,
+}
+
+
+def iowr(nr: int, size: int) -> int:
+    """Номер ioctl _IOWR(0xB4, nr, size)"""
+    return (3 << 30) | (size << 16) | (0xB4 << 8) | nr
+
+
+GPIO_V2_GET_LINE_IOCTL = iowr(0x07, LINE_REQUEST.size)
+GPIO_V2_LINE_GET_VALUES_IOCTL = iowr(0x0E, LINE_VALUES.size)
+GPIO_V2_LINE_SET_VALUES_IOCTL = iowr(0x0F, LINE_VALUES.size)
+
+
+def line_flags(direction: str, edge: str = None) -> int:
+    """Флаги gpio_v2_line_config для заданных direction и edge"""
+    if direction == 'out':
+        return GPIO_V2_LINE_FLAG_OUTPUT
+    elif direction == 'in' and edge in EDGE_FLAGS:
+        return GPIO_V2_LINE_FLAG_INPUT | EDGE_FLAGS[edge]
+    else:
+        raise ValueError
+
+
+class Ioctl:
+    """
+    Системные вызовы, через которые ChipBackend работает с /dev/gpiochipN. Для запуска без платы подменяется
+    имитацией с теми же методами (simgpio.FakeChip)
+    """
+    def open(self, path: str) -> int:
+        return os.open(path, os.O_RDWR | os.O_CLOEXEC)
+
+    def ioctl(self, fd: int, request: int, buf: bytearray) -> None:
+        fcntl.ioctl(fd, request, buf, True)
+
+    def read(self, fd: int, size: int) -> bytes:
+        return os.read(fd, size)
+
+    def close(self, fd: int) -> None:
+        os.close(fd)
+
+
+class ChipBackend:
+    """
+    Доступ к GPIO через символьное устройство /dev/gpiochipN (uAPI v2) вместо sysfs. gpio_line устройств -- номер
+    линии (offset) на чипе. Группа LineGroup запрашивается одним запросом на каждые 64 линии, ее значения
+    записываются и считываются одним ioctl. События кнопок содержат метку времени ядра (CLOCK_MONOTONIC).
+        with ChipBackend('/dev/gpiochip0'):
+            with gpio.Led(17) as led:
+                led.switch()
+    """
+    def __init__(self, chip: str = "/dev/gpiochip0", consumer: str = "pygpiolib", shim=None,
+                 event_buffer_size: int = 16):
+        """
+        :param chip: путь к символьному устройству
+        :param consumer: имя владельца линий, видимое в gpioinfo
+        :param shim: объект с методами open/ioctl/read/close, по умолчанию -- Ioctl
+        :param event_buffer_size: размер буфера событий ядра для каждой линии
+        """
+        self.chip = chip
+        self.consumer = consumer
+        self.shim = shim if shim is not None else Ioctl()
+        self.event_buffer_size = event_buffer_size
+        self.chip_fd = None
+        self.previous = None
+        # Устройство -> бит линии в запросе, дескриптор которого хранится в device.fd
+        self.bits = {}
+
+    def line_path(self, gpio_line) -> str:
+        return f"{self.chip}:{gpio_line}/"
+
+    def get_line(self, offsets, flags: int, values: int = 0) -> int:
+        """
+        Запрашивает линии чипа одним GPIO_V2_GET_LINE_IOCTL
+        :param offsets: номера линий (не более 64)
+        :param flags: флаги конфигурации, общие для всех линий
+        :param values: начальные значения выходов, бит i соответствует offsets[i]
+        :return: дескриптор запроса
+        """
+        if self.chip_fd is None:
+            raise ValueError("Чип не открыт!")
+        if not 0 < len(offsets) <= GPIO_V2_LINES_MAX:
+            raise ValueError("Недопустимое количество линий в запросе!")
+        attrs = [0] * (4 * GPIO_V2_LINE_NUM_ATTRS_MAX)
+        num_attrs = 0
+        if flags & GPIO_V2_LINE_FLAG_OUTPUT:
+            attrs[0:4] = GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES, 0, values, (1 << len(offsets)) - 1
+            num_attrs = 1
+        buf = bytearray(LINE_REQUEST.size)
+        LINE_REQUEST.pack_into(buf, 0, *offsets, *[0] * (GPIO_V2_LINES_MAX - len(offsets)),
+                               self.consumer.encode()[:31], flags, num_attrs, *attrs, len(offsets),
+                               self.event_buffer_size, 0)
+        self.shim.ioctl(self.chip_fd, GPIO_V2_GET_LINE_IOCTL, buf)
+        return LINE_REQUEST.unpack_from(buf)[-1]
+
+    def set_values(self, fd: int, bits: int, mask: int) -> None:
+        """Записывает значения линий запроса, отмеченных в mask, одним ioctl"""
+        buf = bytearray(LINE_VALUES.pack(bits, mask))
+        self.shim.ioctl(fd, GPIO_V2_LINE_SET_VALUES_IOCTL, buf)
+
+    def get_values(self, fd: int, mask: int) -> int:
+        """Считывает значения линий запроса, отмеченных в mask, одним ioctl"""
+        buf = bytearray(LINE_VALUES.pack(0, mask))
+        self.shim.ioctl(fd, GPIO_V2_LINE_GET_VALUES_IOCTL, buf)
+        return LINE_VALUES.unpack(buf)[0] & mask
+
+    def request(self, device, direction: str, edge: str = None) -> None:
+        device.fd = self.get_line([device.gpio_line], line_flags(direction, edge))
+        self.bits[device] = 1
+
+    def release(self, device, off_value=False) -> None:
+        """
+        Освобождает линию устройства. Линии группы (request_group) разделяют один запрос: он закрывается вместе с
+        последней открытой линией, до этого линия остается запрошенной
+        """
+        fd = device.fd
+        if fd is None:
+            return
+        bit = self.bits.pop(device, 1)
+        if off_value:
+            self.set_values(fd, 0, bit)
+        device.fd = None
+        if not any(other.fd == fd for other in self.bits):
+            self.shim.close(fd)
+
+    @staticmethod
+    def chunk_fd(chunk):
+        """Дескриптор запроса части группы (до 64 линий); None -- все линии части освобождены"""
+        for led in chunk:
+            if led.fd is not None:
+                return led.fd
+        return None
+
+    def write(self, device, var) -> None:
+        bit = self.bits[device]
+        self.set_values(device.fd, bit if var else 0, bit)
+
+    def read(self, device) -> int:
+        bit = self.bits[device]
+        return 1 if self.get_values(device.fd, bit) else 0
+
+    def request_group(self, leds) -> None:
+        """Запрашивает светодиоды группы на выход: один запрос на каждые 64 линии"""
+        try:
+            for start in range(0, len(leds), GPIO_V2_LINES_MAX):
+                chunk = leds[start:start + GPIO_V2_LINES_MAX]
+                fd = self.get_line([led.gpio_line for led in chunk], GPIO_V2_LINE_FLAG_OUTPUT)
+                for i, led in enumerate(chunk):
+                    led.fd = fd
+                    self.bits[led] = 1 << i
+        except Exception:
+            self.release_group(leds)
+            raise
+
+    def release_group(self, leds, off_value=False) -> None:
+        for start in range(0, len(leds), GPIO_V2_LINES_MAX):
+            chunk = leds[start:start + GPIO_V2_LINES_MAX]
+            fd = self.chunk_fd(chunk)
+            if fd is None:
+                continue
+            if off_value:
+                self.set_values(fd, 0, (1 << len(chunk)) - 1)
+            self.shim.close(fd)
+            for led in chunk:
+                led.fd = None
+                self.bits.pop(led, None)
+
+    def write_group(self, leds, new: int, changed: int) -> None:
+        full = (1 << GPIO_V2_LINES_MAX) - 1
+        for start in range(0, len(leds), GPIO_V2_LINES_MAX):
+            mask = (changed >> start) & full
+            if mask:
+                fd = leds[start].fd
+                if fd is None:
+                    fd = self.chunk_fd(leds[start:start + GPIO_V2_LINES_MAX])
+                self.set_values(fd, (new >> start) & full, mask)
+        while changed:
+            low = changed & -changed
+            i = low.bit_length() - 1
+            leds[i].update((new >> i) & 1)
+            changed ^= low
+
+    def read_group(self, leds) -> int:
+        result = 0
+        for start in range(0, len(leds), GPIO_V2_LINES_MAX):
+            chunk = leds[start:start + GPIO_V2_LINES_MAX]
+            result |= self.get_values(self.chunk_fd(chunk), (1 << len(chunk)) - 1) << start
+        return result
+
+    def watch(self, gpio_line, fd: int) -> tuple:
+        return fd, select.EPOLLIN
+
+    def acknowledge(self, gpio_line, fd: int) -> gpio.Edge:
+        """
+        Считывает накопленные события запроса
+        :return: последнее событие с меткой времени ядра
+        """
+        data = self.shim.read(fd, LINE_EVENT.size * self.event_buffer_size)
+        timestamp, event_id = LINE_EVENT.unpack_from(data, len(data) - LINE_EVENT.size)[:2]
+        return gpio.Edge(timestamp / 1e9, 1 if event_id == GPIO_V2_LINE_EVENT_RISING_EDGE else 0)
+
+    def open(self):
+        self.chip_fd = self.shim.open(self.chip)
+        self.previous = gpio.set_backend(self)
+
+    def close(self):
+        if self.previous is not None:
+            gpio.set_backend(self.previous)
+            self.previous = None
+        if self.chip_fd is not None:
+            self.shim.close(self.chip_fd)
+            self.chip_fd = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"ChipBackend: {self.chip}"
+
+    def __str__(self):
+        return f"ChipBackend: {self.chip}"
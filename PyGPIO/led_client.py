@@ -1,41 +1,133 @@
 import socket
+import time
 import argparse
 import sys
 import pygpiolib as gpio
+import protocol
 
 
 class Client:
-    def __init__(self, ip: int, port: int, led: int, size: int = 1024):
-        self.led = gpio.Led(led)
+    def __init__(self, ip: int, port: int, led, size: int = 1024, group: str = None, group_port: int = None,
+                 interface: str = '0.0.0.0', keepalive: float = 20.0):
+        """
+        :param led: SYSFSID/GPIO линия светодиода или список линий. В двоичном формате номер линии команды -- индекс
+        в этом списке (номер бита состояния LineGroup), текстовая команда переключения переключает все светодиоды
+        :param group: адрес группы multicast сервера (button_server -g), None -- прием рассылки по подписке
+        :param group_port: порт группы, по умолчанию -- порт сервера
+        :param interface: адрес интерфейса для приема группы, по умолчанию -- выбирается системой
+        :param keepalive: интервал продления подписки на сервере в секундах (должен быть меньше ttl сервера)
+        """
+        # Все светодиоды -- одна группа: команды пакета применяются одной записью изменившихся линий
+        self.group = gpio.LineGroup(led if isinstance(led, (list, tuple)) else [led])
+        self.leds = self.group.leds
+        self.led = self.leds[0]
         self.size = size
         self.ip = ip
         self.port = port
+        self.keepalive = keepalive
+        # Время последней отправки серверу: любой пакет клиента (подписка, подтверждение) продлевает подписку
+        self.sent = time.monotonic()
+        # Повторно полученные пакеты (повторы сервера) подтверждаются, но не выполняются
+        self.received = protocol.Deduplicator()
+        # Номер последнего примененного пакета с состоянием (OP_SET, OP_SNAPSHOT): более старые пакеты, пришедшие
+        # после него (задержанные повторы), подтверждаются, но не выполняются
+        self.applied = None
         self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if group is not None:
+            self.client.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.client.bind(('', port if group_port is None else group_port))
+            self.client.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                   socket.inet_aton(group) + socket.inet_aton(interface))
 
-    def start(self):
-        self.client.sendto(b'9', (self.ip, self.port))
+    def apply(self, data) -> bool:
+        """
+        Выполняет команды пакета сервера в текстовом или двоичном (protocol) формате. Команды пакета собираются в
+        новое состояние группы, записываются только изменившиеся линии; снимок состояния (OP_SNAPSHOT) заменяет
+        состояние целиком. Пакеты с состоянием старше уже примененного не выполняются
+        :return: False если получена команда отключения
+        """
+        if protocol.is_binary(data):
+            sequence, commands = protocol.decode(data)
+            self.send(protocol.ack(sequence))
+            if not self.received.accept(sequence):
+                return True
+            if any(op in (protocol.OP_SET, protocol.OP_SNAPSHOT) for _, op, _ in commands):
+                if self.applied is not None and protocol.older(sequence, self.applied):
+                    return True
+                self.applied = sequence
+            state = self.group.value
+            running = True
+            for line, op, value in commands:
+                if op == protocol.OP_SWITCH:
+                    state ^= 1 << line
+                elif op == protocol.OP_SET:
+                    state = state | 1 << line if value else state & ~(1 << line)
+                elif op == protocol.OP_SNAPSHOT:
+                    state = state & ~(0xFF << 8 * line) | value << 8 * line
+                elif op == protocol.OP_STOP:
+                    running = False
+                    break
+                else:
+                    raise ValueError("Invalid data from server!")
+            self.group.write(state & (1 << len(self.group)) - 1)
+            return running
+        data = int(data)
+        print(data)
+        if data == 1:
+            self.group.write(self.group.value ^ (1 << len(self.group)) - 1)
+        elif data == 0:
+            return False
+        else:
+            raise ValueError("Invalid data from server!")
+        return True
+
+    def send(self, data) -> None:
+        self.client.sendto(data, (self.ip, self.port))
+        self.sent = time.monotonic()
+
+    def receive(self):
+        """
+        Ожидает пакет сервера, продлевая подписку, если серверу ничего не отправлялось keepalive секунд (в том числе
+        при непрерывном потоке пакетов сервера)
+        """
         while True:
+            remaining = self.sent + self.keepalive - time.monotonic()
+            if remaining <= 0:
+                self.send(b'9')
+                continue
+            self.client.settimeout(remaining)
             try:
-                with self.led:
-                    data = int(self.client.recv(self.size))
-                    print(data)
-                    if data == 1:
-                        self.led.switch()
-                    elif data == 0:
-                        break
-                    else:
-                        raise ValueError("Invalid data from server!")
-            except:
-                self.client.close()
-                self.led.close(off_value=True)
-        self.client.close()
+                return self.client.recv(self.size)
+            except socket.timeout:
+                pass
+
+    def start(self):
+        # Первый пакет подписывает клиента на нажатия кнопки
+        self.send(b'9')
+        try:
+            # Линии открываются один раз на все время работы
+            with self.group:
+                while self.apply(self.receive()):
+                    pass
+        finally:
+            # Отмена подписки
+            self.send(b'-1')
+            self.client.close()
 
 
 if __name__ == '__main__':
     args = argparse.ArgumentParser()
-    args.add_argument('-l', '--led', type=int)
+    # -l SYSFSID светодиода, можно указать несколько
+    args.add_argument('-l', '--led', type=int, nargs='+')
     args.add_argument('-p', '--port', type=int)
     args.add_argument('-i', '--ip', type=str)
+    # -g адрес группы multicast сервера, --group-port ее порт
+    args.add_argument('-g', '--group', type=str, default=None)
+    args.add_argument('--group-port', type=int, default=None)
+    args.add_argument('--interface', type=str, default='0.0.0.0')
+    # -k интервал продления подписки в секундах
+    args.add_argument('-k', '--keepalive', type=float, default=20.0)
     values = args.parse_args(sys.argv[1:])
-    orange = Client(values.ip, values.port, values.led)
+    orange = Client(values.ip, values.port, values.led, group=values.group, group_port=values.group_port,
+                    interface=values.interface, keepalive=values.keepalive)
     orange.start()
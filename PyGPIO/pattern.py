@@ -0,0 +1,138 @@
+import threading
+import time
+
+
+class Pattern:
+    """
+    Заранее подготовленная последовательность кадров: смещение от начала в секундах и битовая маска состояния линий
+    группы (бит i -- i-й светодиод LineGroup). Смещения и маски можно передать списками, array или буферами NumPy --
+    они один раз преобразуются во встроенные типы, чтобы при воспроизведении не было лишних преобразований.
+    """
+    def __init__(self, offsets, masks, period: float = None):
+        """
+        :param offsets: неубывающие смещения кадров в секундах
+        :param masks: битовые маски кадров
+        :param period: длительность одного повтора, по умолчанию -- смещение последнего кадра
+        """
+        self.offsets = [float(offset) for offset in offsets]
+        self.masks = [int(mask) for mask in masks]
+        if len(self.offsets) != len(self.masks) or not self.offsets:
+            raise ValueError("Количество смещений и масок должно совпадать и быть больше нуля!")
+        if any(b < a for a, b in zip(self.offsets, self.offsets[1:])) or self.offsets[0] < 0:
+            raise ValueError("Смещения кадров должны быть неотрицательными и неубывающими!")
+        self.period = self.offsets[-1] if period is None else period
+        if self.period < self.offsets[-1]:
+            raise ValueError("Длительность повтора меньше смещения последнего кадра!")
+
+    @classmethod
+    def from_frames(cls, frames, period: float = None):
+        """
+        :param frames: последовательность (смещение, маска)
+        """
+        frames = list(frames)
+        return cls([frame[0] for frame in frames], [frame[1] for frame in frames], period)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __repr__(self):
+        return f"Pattern: frames : {len(self)} period : {self.period}"
+
+    def __str__(self):
+        return f"Pattern: frames : {len(self)} period : {self.period}"
+
+
+class Player:
+    """
+    Воспроизведение Pattern на открытой LineGroup. Кадры выводятся по абсолютному времени от начала воспроизведения
+    (опоздание одного кадра не сдвигает следующие), записываются только изменившиеся линии. Для каждого кадра
+    собирается статистика опоздания.
+        with gpio.LineGroup([64, 65, 66]) as group:
+            Player(group, Pattern.from_frames([(0, 0b001), (0.1, 0b010), (0.2, 0b100)], 0.3), loops=0).play()
+    """
+    def __init__(self, group, pattern: Pattern, loops: int = 1, spin: float = 0.0002):
+        """
+        :param group: открытая LineGroup
+        :param pattern: последовательность кадров
+        :param loops: количество повторов, 0 -- до вызова stop()
+        :param spin: за сколько секунд до кадра ожидание сменяется активным опросом часов (точнее, но занимает ядро)
+        """
+        # Маски проверяются до воспроизведения, чтобы ошибка не прерывала его после вывода части кадров
+        for mask in pattern.masks:
+            group.mask(mask)
+        if not loops and pattern.period <= 0:
+            raise ValueError("Бесконечное воспроизведение требует длительности повтора больше нуля!")
+        self.group = group
+        self.pattern = pattern
+        self.loops = loops
+        self.spin = spin
+        self.thread = None
+        self.__stop = threading.Event()
+        self.reset()
+
+    def reset(self) -> None:
+        """Сбрасывает статистику опоздания"""
+        frames = len(self.pattern)
+        self.count = [0] * frames
+        self.total_lateness = [0.0] * frames
+        self.max_lateness = [0.0] * frames
+
+    def play(self) -> None:
+        """Воспроизводит последовательность в текущем потоке"""
+        self.__stop.clear()
+        offsets, masks, period = self.pattern.offsets, self.pattern.masks, self.pattern.period
+        count, total, maximum = self.count, self.total_lateness, self.max_lateness
+        write = self.group.write
+        start = time.monotonic()
+        loop = 0
+        while not self.loops or loop < self.loops:
+            base = start + loop * period
+            for i, offset in enumerate(offsets):
+                deadline = base + offset
+                remaining = deadline - time.monotonic() - self.spin
+                if remaining > 0 and self.__stop.wait(remaining):
+                    return
+                while time.monotonic() < deadline:
+                    pass
+                write(masks[i])
+                lateness = time.monotonic() - deadline
+                count[i] += 1
+                total[i] += lateness
+                if lateness > maximum[i]:
+                    maximum[i] = lateness
+                if self.__stop.is_set():
+                    return
+            loop += 1
+        # Последний кадр длится до конца периода
+        remaining = start + loop * period - time.monotonic()
+        if remaining > 0:
+            self.__stop.wait(remaining)
+
+    def statistics(self) -> dict:
+        """
+        Статистика опоздания вывода кадров в секундах: по каждому кадру (frames) и общая
+        """
+        frames = [{'count': n, 'mean': t / n if n else 0.0, 'max': m}
+                  for n, t, m in zip(self.count, self.total_lateness, self.max_lateness)]
+        played = sum(self.count)
+        return {'frames': frames,
+                'count': played,
+                'mean': sum(self.total_lateness) / played if played else 0.0,
+                'max': max(self.max_lateness)}
+
+    def start(self) -> None:
+        """Воспроизводит последовательность в отдельном потоке"""
+        self.thread = threading.Thread(target=self.play, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __repr__(self):
+        return f"Player: {self.pattern} loops : {self.loops}"
+
+    def __str__(self):
+        return f"Player: {self.pattern} loops : {self.loops}"
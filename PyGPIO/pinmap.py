@@ -0,0 +1,168 @@
+import pygpiolib as gpio
+import collections
+import json
+import os
+
+Pin = collections.namedtuple('Pin', ['name', 'line', 'direction', 'edge', 'value', 'debounce'])
+
+DIRECTIONS = ('in', 'out')
+EDGES = ('none', 'rising', 'falling', 'both')
+
+
+def parse(config: dict) -> list:
+    """
+    Разбирает описание линий платы: имя -> {"line", "direction", "edge", "value", "debounce"}
+        {"power": {"line": 11, "direction": "in", "edge": "rising", "debounce": 0.05},
+         "status": {"line": 110, "direction": "out", "value": 1}}
+    direction по умолчанию -- in, edge входа -- both, value выхода -- 0, debounce -- 0
+    :return: список Pin
+    """
+    pins = []
+    lines = set()
+    for name, spec in config.items():
+        direction = spec.get('direction', 'in')
+        if direction not in DIRECTIONS:
+            raise ValueError(f"{name}: недопустимое значение direction: {direction}")
+        line = int(spec['line'])
+        if line in lines:
+            raise ValueError(f"{name}: линия {line} описана повторно!")
+        lines.add(line)
+        if direction == 'in':
+            edge = spec.get('edge', 'both')
+            if edge not in EDGES:
+                raise ValueError(f"{name}: недопустимое значение edge: {edge}")
+            pins.append(Pin(name, line, direction, edge, None, float(spec.get('debounce', 0))))
+        else:
+            value = int(spec.get('value', 0))
+            if value not in (0, 1):
+                raise ValueError(f"{name}: недопустимое значение value: {value}")
+            pins.append(Pin(name, line, direction, None, value, 0.0))
+    return pins
+
+
+def load(path: str) -> list:
+    """Читает описание линий платы из файла JSON (см. parse)"""
+    with open(path, 'r') as reader:
+        return parse(json.load(reader))
+
+
+def attribute(gpio_line, name: str):
+    """Содержимое атрибута линии; None -- атрибута нет (edge у линии без прерывания)"""
+    try:
+        with open(f"{gpio.backend.line_path(gpio_line)}{name}", 'r') as reader:
+            return reader.read().strip()
+    except OSError:
+        return None
+
+
+def reconcile(pins) -> list:
+    """
+    Приводит линии sysfs в состояние, описанное pins. Текущее состояние считывается один раз (gpio.registry.refresh и
+    значения уже настроенных выходов), записываются только отличающиеся атрибуты. Выход настраивается записью
+    high/low в direction -- одним системным вызовом, с начальным значением без промежуточного состояния
+    :return: выполненные записи -- список (линия, атрибут, значение)
+    """
+    gpio.registry.refresh()
+    writes = []
+    for pin in pins:
+        line = pin.line
+        if not gpio.gpio_exists(line):
+            gpio.gpio_export(line)
+            writes.append((line, 'export', line))
+            # Состояние только что экспортированной линии задается ядром
+            gpio.registry.set(line, 'direction', attribute(line, 'direction'))
+            if pin.direction == 'in':
+                gpio.registry.set(line, 'edge', attribute(line, 'edge'))
+        current = gpio.registry.get(line, 'direction')
+        if pin.direction == 'out':
+            if current != 'out':
+                level = 'high' if pin.value else 'low'
+                gpio.backend.direction(line, level)
+                gpio.registry.set(line, 'direction', 'out')
+                writes.append((line, 'direction', level))
+            elif int(attribute(line, 'value')) != pin.value:
+                gpio.unsafe_write(f"{gpio.backend.line_path(line)}value", pin.value)
+                writes.append((line, 'value', pin.value))
+        else:
+            if current != 'in':
+                gpio.backend.direction(line, 'in')
+                gpio.registry.set(line, 'direction', 'in')
+                writes.append((line, 'direction', 'in'))
+            if gpio.registry.get(line, 'edge') != pin.edge:
+                gpio.check_write(f"{gpio.backend.line_path(line)}edge", pin.edge)
+                gpio.registry.set(line, 'edge', pin.edge)
+                writes.append((line, 'edge', pin.edge))
+    return writes
+
+
+class PinMap:
+    """
+    Линии платы по описанию (файл JSON или словарь, см. parse). При открытии линии приводятся в описанное состояние
+    (reconcile), затем создаются именованные Led и Button с открытыми файлами value (cached). Кнопки можно передавать
+    в ButtonMultiplexer, светодиоды -- использовать как обычно.
+        with PinMap('board.json') as board:
+            board['status'].switch()
+            board['power'].click()
+    """
+    def __init__(self, config):
+        """
+        :param config: путь к файлу JSON, словарь описания или список Pin
+        """
+        if isinstance(config, str):
+            self.pins = load(config)
+        elif isinstance(config, dict):
+            self.pins = parse(config)
+        else:
+            self.pins = list(config)
+        self.handles = {}
+        # Записи, выполненные при последнем открытии
+        self.writes = []
+
+    def open(self):
+        try:
+            self.writes = reconcile(self.pins)
+            for pin in self.pins:
+                if pin.direction == 'out':
+                    handle = gpio.Led(pin.line, cached=True)
+                    handle.update(pin.value)
+                    mode = os.O_RDWR
+                else:
+                    handle = gpio.Button(pin.line, pin.edge, cached=True, debounce=pin.debounce)
+                    mode = os.O_RDONLY
+                handle.fd = os.open(f"{handle.path}value", mode)
+                handle.opened = True
+                self.handles[pin.name] = handle
+        except Exception:
+            self.close()
+            raise
+
+    def close(self, off_value=True):
+        """Закрывает все линии; если off_value -- выходы выключаются"""
+        handles, self.handles = self.handles, {}
+        for pin in self.pins:
+            handle = handles.get(pin.name)
+            if handle is None:
+                gpio.gpio_try_close(pin.line)
+            elif isinstance(handle, gpio.Led):
+                handle.close(off_value)
+            else:
+                handle.close()
+
+    def __getitem__(self, name):
+        return self.handles[name]
+
+    def __contains__(self, name):
+        return name in self.handles
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"PinMap: {[f'{pin.name}: {pin.line}' for pin in self.pins]}"
+
+    def __str__(self):
+        return f"PinMap: {[f'{pin.name}: {pin.line}' for pin in self.pins]}"
@@ -0,0 +1,241 @@
+import collections
+import struct
+import threading
+import time
+
+# Двоичный формат пакета: заголовок и массив команд.
+# Заголовок: сигнатура b'PG', версия, флаги (зарезервировано), номер пакета, количество команд
+HEADER = struct.Struct("!2sBBIH")
+# Команда: номер линии, операция, значение
+COMMAND = struct.Struct("!HBB")
+
+MAGIC = b'PG'
+VERSION = 1
+
+# Операции
+OP_SWITCH = 1       # переключить линию
+OP_SET = 2          # установить значение линии (value)
+OP_STOP = 3         # отключить клиент (в текстовом режиме -1 от клиента, 0 от button_server)
+OP_SHUTDOWN = 4     # отключить клиент затем выключить сервер (в текстовом режиме -2)
+OP_ACK = 5          # подтверждение (в текстовом режиме ответ 1)
+OP_DATA = 6         # произвольное число value (в текстовом режиме -- число от клиента)
+OP_SNAPSHOT = 7     # снимок состояния: value -- байт номер line битовой маски (линии 8*line..8*line+7)
+
+# Максимальное количество команд в одном пакете размером не больше 1024 байт
+MAX_COMMANDS = (1024 - HEADER.size) // COMMAND.size
+
+Command = collections.namedtuple('Command', ['line', 'op', 'value'])
+
+
+def is_binary(data) -> bool:
+    """Проверяет, является ли пакет двоичным (по сигнатуре)"""
+    return len(data) >= HEADER.size and data[:2] == MAGIC
+
+
+def older(sequence: int, last: int, window: int = 1 << 16) -> bool:
+    """
+    Сравнение номеров пакетов по модулю 2**32 (serial number arithmetic, RFC 1982)
+    :param sequence: номер полученного пакета
+    :param last: номер последнего примененного пакета
+    :param window: пакеты, отстающие больше чем на window номеров, считаются новыми (перезапуск сервера с другим
+    начальным номером), а не задержанными повторами
+    :return: True если пакет sequence отправлен не позже пакета last
+    """
+    return ((last - sequence) & 0xFFFFFFFF) < window
+
+
+def ack(sequence: int) -> bytes:
+    """Пакет подтверждения получения пакета sequence"""
+    return encode(sequence, [(0, OP_ACK, 0)])
+
+
+def encode(sequence: int, commands) -> bytes:
+    """
+    Собирает двоичный пакет
+    :param sequence: номер пакета (по модулю 2**32)
+    :param commands: последовательность Command или кортежей (line, op, value)
+    :return: пакет
+    """
+    commands = list(commands)
+    if len(commands) > MAX_COMMANDS:
+        raise ValueError("Слишком много команд в одном пакете!")
+    buffer = bytearray(HEADER.size + COMMAND.size * len(commands))
+    HEADER.pack_into(buffer, 0, MAGIC, VERSION, 0, sequence & 0xFFFFFFFF, len(commands))
+    for i, command in enumerate(commands):
+        COMMAND.pack_into(buffer, HEADER.size + COMMAND.size * i, *command)
+    return bytes(buffer)
+
+
+def snapshot(sequence: int, state: int, lines: int) -> bytes:
+    """
+    Пакет со снимком состояния линий
+    :param state: битовая маска состояния (бит i -- линия i)
+    :param lines: количество линий
+    """
+    return encode(sequence, [(i, OP_SNAPSHOT, (state >> 8 * i) & 0xFF) for i in range((lines + 7) // 8)])
+
+
+def decode(data) -> tuple:
+    """
+    Разбирает двоичный пакет
+    :param data: bytes, bytearray или memoryview
+    :return: (номер пакета, список Command)
+    """
+    if not is_binary(data):
+        raise ValueError("Не двоичный пакет!")
+    _, version, _, sequence, count = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"Неподдерживаемая версия протокола: {version}")
+    if len(data) < HEADER.size + COMMAND.size * count:
+        raise ValueError("Пакет обрезан!")
+    return sequence, [Command(*command) for command in
+                      COMMAND.iter_unpack(data[HEADER.size:HEADER.size + COMMAND.size * count])]
+
+
+class Peer:
+    """Состояние доставки одному получателю: пакеты без подтверждения и оценка времени ответа (RFC 6298)"""
+    def __init__(self, rto: float):
+        # номер пакета -> [пакет, время повтора, количество повторов, время первой отправки]
+        self.pending = collections.OrderedDict()
+        self.srtt = None
+        self.rttvar = None
+        self.rto = rto
+
+    def sample(self, rtt: float, min_rto: float, max_rto: float) -> None:
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(max_rto, max(min_rto, self.srtt + 4 * self.rttvar))
+
+
+class Retransmitter:
+    """
+    Подтверждаемая доставка пакетов: отправитель передает пакет сразу и регистрирует его через sent(), получатель
+    отвечает пакетом OP_ACK с тем же номером. Пакеты без подтверждения повторяются через due() с таймаутом, который
+    подстраивается под время ответа каждого получателя (повторно отправленные пакеты в оценке не участвуют), и
+    экспоненциально растет при повторах. У каждого получателя не больше window пакетов без подтверждения -- при
+    переполнении самый старый отбрасывается.
+    """
+    def __init__(self, window: int = 32, rto: float = 0.2, min_rto: float = 0.01, max_rto: float = 2.0,
+                 retries: int = 8):
+        """
+        :param window: максимальное количество пакетов без подтверждения у одного получателя
+        :param rto: начальный таймаут повтора в секундах
+        :param min_rto: минимальный таймаут
+        :param max_rto: максимальный таймаут
+        :param retries: количество повторов, после которого пакет отбрасывается
+        """
+        self.window = window
+        self.initial_rto = rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.retries = retries
+        self.peers = {}
+        self.counters = collections.Counter()
+        self.__lock = threading.Lock()
+
+    def sent(self, address, sequence: int, data: bytes) -> None:
+        """Регистрирует отправленный пакет"""
+        now = time.monotonic()
+        with self.__lock:
+            peer = self.peers.get(address)
+            if peer is None:
+                peer = self.peers[address] = Peer(self.initial_rto)
+            if len(peer.pending) >= self.window:
+                peer.pending.popitem(last=False)
+                self.counters['dropped'] += 1
+            peer.pending[sequence & 0xFFFFFFFF] = [data, now + peer.rto, 0, now]
+            self.counters['sent'] += 1
+
+    def ack(self, address, sequence: int) -> bool:
+        """
+        Обрабатывает подтверждение
+        :return: True если пакет ожидал подтверждения
+        """
+        now = time.monotonic()
+        with self.__lock:
+            peer = self.peers.get(address)
+            entry = None if peer is None else peer.pending.pop(sequence, None)
+            if entry is None:
+                return False
+            if not entry[2]:
+                peer.sample(now - entry[3], self.min_rto, self.max_rto)
+            self.counters['acked'] += 1
+        return True
+
+    def due(self) -> list:
+        """
+        Пакеты, время повтора которых наступило
+        :return: список (пакет, адрес)
+        """
+        now = time.monotonic()
+        resend = []
+        with self.__lock:
+            for address, peer in self.peers.items():
+                for sequence, entry in list(peer.pending.items()):
+                    if entry[1] > now:
+                        continue
+                    if entry[2] >= self.retries:
+                        del peer.pending[sequence]
+                        self.counters['failed'] += 1
+                        continue
+                    entry[2] += 1
+                    entry[1] = now + min(self.max_rto, peer.rto * 2 ** entry[2])
+                    resend.append((entry[0], address))
+            self.counters['retransmitted'] += len(resend)
+        return resend
+
+    def timeout(self, idle: float = 0.1) -> float:
+        """Время до ближайшего повтора в секундах, но не больше idle"""
+        now = time.monotonic()
+        with self.__lock:
+            deadlines = [entry[1] for peer in self.peers.values() for entry in peer.pending.values()]
+        if not deadlines:
+            return idle
+        return min(idle, max(0.001, min(deadlines) - now))
+
+    def forget(self, address) -> None:
+        """Удаляет получателя вместе с его пакетами без подтверждения"""
+        with self.__lock:
+            self.peers.pop(address, None)
+
+    def statistics(self) -> dict:
+        """Счетчики пакетов (sent, acked, retransmitted, dropped, failed) и таймаут повтора по получателям"""
+        with self.__lock:
+            return {'counters': dict(self.counters),
+                    'rto': {f"{address}": peer.rto for address, peer in self.peers.items()},
+                    'pending': sum(len(peer.pending) for peer in self.peers.values())}
+
+    def __repr__(self):
+        return f"Retransmitter: peers : {len(self.peers)} window : {self.window}"
+
+    def __str__(self):
+        return f"Retransmitter: peers : {len(self.peers)} window : {self.window}"
+
+
+class Deduplicator:
+    """Отбрасывает повторно полученные пакеты: помнит номера последних size пакетов"""
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self.__seen = set()
+        self.__order = collections.deque()
+
+    def accept(self, sequence: int) -> bool:
+        """
+        :return: True если пакет с таким номером получен впервые
+        """
+        if sequence in self.__seen:
+            return False
+        self.__seen.add(sequence)
+        self.__order.append(sequence)
+        if len(self.__order) > self.size:
+            self.__seen.discard(self.__order.popleft())
+        return True
+
+    def __repr__(self):
+        return f"Deduplicator: size : {self.size}"
+
+    def __str__(self):
+        return f"Deduplicator: size : {self.size}"
@@ -0,0 +1,185 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class Channel:
+    """
+    Канал программного ШИМ: светодиод, частота и коэффициент заполнения. Хранит статистику опоздания переключений
+    относительно расчетного времени (jitter)
+    """
+    def __init__(self, led, frequency: float, duty: float):
+        self.led = led
+        self.frequency = frequency
+        self.duty = duty
+        # Абсолютное время следующего переключения по time.monotonic()
+        self.deadline = None
+        # Номер версии параметров: записи очереди со старой версией пропускаются
+        self.generation = 0
+        self.on = False
+        self.count = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def fire(self, now: float):
+        """
+        Выполняет переключение, запланированное на self.deadline
+        :param now: текущее время
+        :return: время следующего переключения или None, если светодиод горит (гаснет) постоянно
+        """
+        lateness = now - self.deadline
+        self.count += 1
+        self.total_lateness += lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        if self.duty <= 0 or self.duty >= 1:
+            self.on = self.duty >= 1
+            self.led.value = int(self.on)
+            return None
+        period = 1 / self.frequency
+        self.on = not self.on
+        self.led.value = int(self.on)
+        deadline = self.deadline + (self.duty if self.on else 1 - self.duty) * period
+        # При отставании больше чем на фазу следующее переключение выполняется сразу
+        return deadline if deadline > now else now
+
+    def jitter(self) -> dict:
+        """Статистика опоздания переключений в секундах"""
+        return {'count': self.count,
+                'mean': self.total_lateness / self.count if self.count else 0.0,
+                'max': self.max_lateness}
+
+    def __repr__(self):
+        return f"Channel: GPIO/SYSFSID : {self.led.gpio_line} frequency : {self.frequency} duty : {self.duty}"
+
+    def __str__(self):
+        return f"Channel: GPIO/SYSFSID : {self.led.gpio_line} frequency : {self.frequency} duty : {self.duty}"
+
+
+def check(frequency: float, duty: float) -> None:
+    if frequency <= 0:
+        raise ValueError("Частота должна быть больше нуля!")
+    if not 0 <= duty <= 1:
+        raise ValueError("Коэффициент заполнения должен быть в диапазоне [0, 1]!")
+
+
+class PwmEngine:
+    """
+    Программный ШИМ для любого количества светодиодов в одном потоке. Переключения планируются по абсолютному времени
+    (time.monotonic) через очередь с приоритетом, поэтому ошибка не накапливается от периода к периоду. Частота и
+    коэффициент заполнения каналов меняются во время работы.
+        with gpio.Led(110, cached=True) as led, PwmEngine() as engine:
+            engine.add(led, frequency=2, duty=0.5)
+    Светодиоды открываются и закрываются вызывающим кодом.
+    """
+    def __init__(self):
+        self.channels = {}
+        self.power_on = False
+        self.thread = None
+        self.__heap = []
+        self.__sequence = itertools.count()
+        self.__condition = threading.Condition()
+
+    def __schedule(self, channel, deadline):
+        channel.deadline = deadline
+        heapq.heappush(self.__heap, (deadline, next(self.__sequence), channel, channel.generation))
+        self.__condition.notify()
+
+    def add(self, led, frequency: float, duty: float = 0.5) -> Channel:
+        """
+        Добавляет канал. Первое переключение (включение) выполняется сразу
+        :param led: открытый светодиод (рекомендуется cached=True)
+        :param frequency: частота в Гц
+        :param duty: коэффициент заполнения 0..1
+        """
+        check(frequency, duty)
+        with self.__condition:
+            if led in self.channels:
+                raise ValueError("Канал для этого светодиода уже добавлен!")
+            channel = Channel(led, frequency, duty)
+            self.channels[led] = channel
+            self.__schedule(channel, time.monotonic())
+        return channel
+
+    def set(self, led, frequency: float = None, duty: float = None) -> None:
+        """
+        Изменяет параметры канала. Текущая фаза сокращается, если по новым параметрам она должна закончиться раньше
+        :param led: светодиод канала
+        :param frequency: новая частота, None -- без изменения
+        :param duty: новый коэффициент заполнения, None -- без изменения
+        """
+        with self.__condition:
+            channel = self.channels[led]
+            frequency = channel.frequency if frequency is None else frequency
+            duty = channel.duty if duty is None else duty
+            check(frequency, duty)
+            channel.frequency, channel.duty = frequency, duty
+            now = time.monotonic()
+            deadline = now + (duty if channel.on else 1 - duty) / frequency
+            if not 0 < duty < 1 or channel.deadline is None:
+                # Постоянное состояние применяется сразу, канал в постоянном состоянии запускается заново
+                deadline = now
+            elif deadline >= channel.deadline:
+                return
+            channel.generation += 1
+            self.__schedule(channel, deadline)
+
+    def remove(self, led, off_value: bool = True) -> None:
+        """Удаляет канал; если off_value -- светодиод выключается"""
+        with self.__condition:
+            channel = self.channels.pop(led)
+            channel.generation += 1
+            if off_value:
+                led.value = 0
+
+    def jitter(self) -> dict:
+        """Статистика опоздания переключений по каналам: gpio_line -> {'count', 'mean', 'max'}"""
+        with self.__condition:
+            return {led.gpio_line: channel.jitter() for led, channel in self.channels.items()}
+
+    def run(self) -> None:
+        """Цикл планировщика, выполняется до вызова stop()"""
+        with self.__condition:
+            while self.power_on:
+                if not self.__heap:
+                    self.__condition.wait()
+                    continue
+                deadline, _, channel, generation = self.__heap[0]
+                now = time.monotonic()
+                if deadline > now:
+                    self.__condition.wait(deadline - now)
+                    continue
+                heapq.heappop(self.__heap)
+                if generation != channel.generation or self.channels.get(channel.led) is not channel:
+                    continue
+                following = channel.fire(now)
+                if following is None:
+                    channel.deadline = None
+                else:
+                    self.__schedule(channel, following)
+
+    def start(self) -> None:
+        self.power_on = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        with self.__condition:
+            self.power_on = False
+            self.__condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __repr__(self):
+        return f"PwmEngine: {list(self.channels.values())}"
+
+    def __str__(self):
+        return f"PwmEngine: {list(self.channels.values())}"
@@ -1,9 +1,51 @@
 import select
 import os
+import queue
+import asyncio
+import time
+import collections
+import concurrent.futures
+import threading
+import bisect
+import json
 
 
 __version__ = 0.1
 
+# Заранее закодированные значения для записи в файл value (индекс -- записываемое значение)
+VALUES = (b'0', b'1')
+
+# Событие на линии: время по time.monotonic() и значение value, считанное при срабатывании
+Edge = collections.namedtuple('Edge', ['timestamp', 'value'])
+
+# Время запуска линии в open_many() в секундах: экспорт, ожидание прав на запись атрибутов, настройка, всего
+Startup = collections.namedtuple('Startup', ['export', 'ready', 'configure', 'total'])
+
+# Наблюдатели (см. add_hook). Кортежи заменяются целиком при добавлении и удалении, поэтому вызовы из других потоков
+# не требуют блокировки, а без наблюдателей проверка стоит одного перебора пустого кортежа
+edge_hooks = ()     # hook(button, value, timestamp, accepted) после фильтра дребезга Button.accept
+output_hooks = ()   # hook(led, value) после записи Led.value
+write_hooks = ()    # hook(path, value) после записи unsafe_write/check_write
+HOOKS = {'edge': 'edge_hooks', 'output': 'output_hooks', 'write': 'write_hooks'}
+hooks_lock = threading.Lock()
+
+
+def add_hook(kind: str, hook) -> None:
+    """
+    Добавляет наблюдателя событий кнопок, записи светодиодов или записи в файлы sysfs. Наблюдатели независимы друг
+    от друга: их можно добавлять и удалять в любом порядке
+    :param kind: edge, output или write
+    :param hook: функция, см. edge_hooks, output_hooks, write_hooks
+    """
+    with hooks_lock:
+        globals()[HOOKS[kind]] += (hook,)
+
+
+def remove_hook(kind: str, hook) -> None:
+    """Удаляет наблюдателя, добавленного add_hook; отсутствующий наблюдатель игнорируется"""
+    with hooks_lock:
+        globals()[HOOKS[kind]] = tuple(h for h in globals()[HOOKS[kind]] if h != hook)
+
 
 def unsafe_write(path: str, value) -> None:
     """
@@ -14,53 +56,274 @@ def unsafe_write(path: str, value) -> None:
     """
     with open(path, "w") as wr:
         wr.write(str(value))
+    for hook in write_hooks:
+        hook(path, value)
 
 
 def check_write(path: str, value) -> None:
     """
-    Осуществляет запись значения (value) в файл после проверки на существование. Вызывает исключение если файл не
-    существует
+    Осуществляет запись значения (value) в существующий файл. Вызывает исключение если файл не существует
+    (файл открывается без создания, отдельная проверка на существование не выполняется)
     :param path : Путь к файлу
     :param value: Знпачение, которое будет записано
     :return: None
     """
-    if not os.path.exists(path):
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_TRUNC)
+    except FileNotFoundError:
         raise ValueError
-    else:
-        with open(path, "w") as wr:
-            wr.write(str(value))
+    try:
+        os.write(fd, str(value).encode())
+    finally:
+        os.close(fd)
+    for hook in write_hooks:
+        hook(path, value)
 
 
 def try_write(path: str, value) -> bool:
     """
-    Осуществляет запись значения (value) в файл после проверки на существование. Возвращает bool-значение, не вызывает
-    исключения
+    Осуществляет запись значения (value) в существующий файл. Возвращает bool-значение, не вызывает исключения
     :param path: Путь к файлу
     :param value: Значение, которое будет записано
     :return:
         True - если файл существует и значение успешно записано
         False - Если файл не существует
     """
-    if not os.path.exists(path):
+    try:
+        check_write(path, value)
+    except ValueError:
         return False
-    else:
-        with open(path, "w") as wr:
-            wr.write(str(value))
-        return True
+    return True
+
+
+class SysfsBackend:
+    """
+    Доступ к GPIO через sysfs. Корневой каталог задается аргументом root, по умолчанию -- значение переменной
+    окружения PYGPIO_ROOT или /sys/class/gpio
+    """
+    def __init__(self, root: str = None):
+        self.root = root if root is not None else os.environ.get("PYGPIO_ROOT", "/sys/class/gpio")
+
+    def line_path(self, gpio_line) -> str:
+        """Каталог экспортированной gpio - линии (с завершающим /)"""
+        return f"{self.root}/gpio{gpio_line}/"
+
+    def export(self, gpio_line) -> None:
+        unsafe_write(f"{self.root}/export", gpio_line)
+
+    def unexport(self, gpio_line) -> None:
+        unsafe_write(f"{self.root}/unexport", gpio_line)
+
+    def direction(self, gpio_line, direction: str) -> None:
+        """
+        Записывает direction экспортированной линии. high/low -- настройка на выход с начальным значением 1/0 одной
+        записью, без кратковременного появления на выходе прежнего значения
+        """
+        unsafe_write(f"{self.line_path(gpio_line)}direction", direction)
+
+    def request(self, device, direction: str, edge: str = None) -> None:
+        """
+        Открывает линию устройства: экспорт, запись direction и edge. Для cached-устройств открывает файл value и
+        сохраняет дескриптор в device.fd
+        """
+        gpio_open(device.gpio_line, direction, edge)
+        if device.cached:
+            device.fd = os.open(f"{self.line_path(device.gpio_line)}value",
+                                os.O_RDONLY if direction == 'in' else os.O_RDWR)
+
+    def release(self, device, off_value=False) -> None:
+        """Закрывает дескриптор устройства (если открыт) и отменяет экспорт линии"""
+        if device.fd is not None:
+            os.close(device.fd)
+            device.fd = None
+        gpio_try_close(device.gpio_line, off_value)
+
+    def write(self, device, var) -> None:
+        """Записывает значение линии: через открытый дескриптор одним pwrite, иначе -- open/write/close"""
+        if device.fd is not None:
+            os.pwrite(device.fd, VALUES[var], 0)
+        else:
+            unsafe_write(f"{self.line_path(device.gpio_line)}value", var)
+
+    def read(self, device) -> int:
+        """Считывает значение линии: через открытый дескриптор одним pread, иначе -- open/read/close"""
+        if device.fd is not None:
+            return int(os.pread(device.fd, 2, 0)[:1])
+        with open(f"{self.line_path(device.gpio_line)}value", "r") as reader:
+            return int(reader.read(1))
+
+    def request_group(self, leds) -> None:
+        """Открывает на выход все светодиоды группы. При ошибке уже открытые линии закрываются"""
+        opened = []
+        try:
+            for led in leds:
+                led.cached = True
+                led.open('out')
+                opened.append(led)
+        except Exception:
+            for led in opened:
+                led.close(True)
+            raise
+
+    def release_group(self, leds, off_value=False) -> None:
+        for led in leds:
+            led.close(off_value)
+
+    def write_group(self, leds, new: int, changed: int) -> None:
+        """
+        Записывает значения линий группы
+        :param leds: светодиоды группы, бит i соответствует leds[i]
+        :param new: новая битовая маска состояния группы
+        :param changed: маска линий, которые нужно записать
+        """
+        while changed:
+            low = changed & -changed
+            i = low.bit_length() - 1
+            leds[i].value = (new >> i) & 1
+            changed ^= low
+
+    def read_group(self, leds) -> int:
+        """Считывает значения всех линий группы в битовую маску"""
+        result = 0
+        for i, led in enumerate(leds):
+            result |= self.read(led) << i
+        return result
+
+    def watch(self, gpio_line, fd: int) -> tuple:
+        """
+        Подготавливает ожидание события на линии: сбрасывает признак события, выставленный при открытии файла value
+        :param gpio_line: gpio - линия
+        :param fd: открытый дескриптор файла value
+        :return: (дескриптор, маска событий) для регистрации в epoll
+        """
+        os.pread(fd, 2, 0)
+        return fd, select.EPOLLPRI
+
+    def acknowledge(self, gpio_line, fd: int) -> Edge:
+        """
+        Сбрасывает признак события после срабатывания epoll
+        :return: событие -- время срабатывания и значение линии
+        """
+        return Edge(time.monotonic(), int(os.pread(fd, 2, 0)[:1]))
+
+    def __repr__(self):
+        return f"SysfsBackend: {self.root}"
+
+    def __str__(self):
+        return f"SysfsBackend: {self.root}"
+
+
+backend = SysfsBackend()
+
+
+def sysfs_root() -> str:
+    """
+    Корневой каталог sysfs текущего backend. Реестр, экспорт линий и open_many работают только с backend на основе
+    sysfs (SysfsBackend и его наследники)
+    """
+    root = getattr(backend, 'root', None)
+    if root is None:
+        raise ValueError(f"{backend} не поддерживает экспорт линий через sysfs!")
+    return root
+
+
+def set_backend(new) -> SysfsBackend:
+    """
+    Устанавливает backend, через который работают все функции и классы модуля
+    :param new: экземпляр SysfsBackend или его наследника
+    :return: предыдущий backend
+    """
+    global backend
+    previous, backend = backend, new
+    return previous
+
+
+class Registry:
+    """
+    Реестр экспортированных линий и их настроек direction/edge для текущего backend. Заполняется одним просмотром
+    корневого каталога при первом обращении, далее обновляется функциями gpio_export/gpio_unexport/gpio_configure
+    этого модуля. Если линии экспортируются другими процессами -- вызовите refresh().
+    """
+    def __init__(self):
+        # gpio_line -> {'direction': ..., 'edge': ...}, None -- значение неизвестно
+        self.lines = None
+        self.root = None
+
+    def refresh(self) -> None:
+        """Заново заполняет реестр по содержимому корневого каталога backend"""
+        lines = {}
+        root = sysfs_root()
+        try:
+            entries = os.scandir(root)
+        except FileNotFoundError:
+            entries = None
+        if entries is not None:
+            with entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith("gpio") and name[4:].isdigit():
+                        gpio_line = int(name[4:])
+                        lines[gpio_line] = {'direction': self.__attribute(gpio_line, 'direction'),
+                                            'edge': self.__attribute(gpio_line, 'edge')}
+        self.lines, self.root = lines, root
+
+    @staticmethod
+    def __attribute(gpio_line, name):
+        try:
+            with open(f"{backend.line_path(gpio_line)}{name}", "r") as reader:
+                return reader.read().strip()
+        except OSError:
+            return None
+
+    def seed(self) -> None:
+        """
+        Заполняет реестр, если он пуст или заполнен для другого backend. Вызывается перед работой с реестром из
+        нескольких потоков: дальнейшие обращения не заменяют словарь lines, а только изменяют отдельные записи
+        """
+        if self.lines is None or self.root != sysfs_root():
+            self.refresh()
+
+    def __lines(self) -> dict:
+        self.seed()
+        return self.lines
+
+    def exported(self, gpio_line) -> bool:
+        return int(gpio_line) in self.__lines()
+
+    def add(self, gpio_line) -> None:
+        """Отмечает линию экспортированной; настройки direction/edge неизвестны до первой записи"""
+        self.__lines()[int(gpio_line)] = {'direction': None, 'edge': None}
+
+    def remove(self, gpio_line) -> None:
+        self.__lines().pop(int(gpio_line), None)
+
+    def get(self, gpio_line, name: str):
+        """Последнее известное значение атрибута (direction/edge) или None"""
+        return self.__lines().get(int(gpio_line), {}).get(name)
+
+    def set(self, gpio_line, name: str, value) -> None:
+        self.__lines().setdefault(int(gpio_line), {'direction': None, 'edge': None})[name] = value
+
+    def __repr__(self):
+        return f"Registry: {self.lines}"
+
+    def __str__(self):
+        return f"Registry: {self.lines}"
+
+
+registry = Registry()
 
 
 def gpio_exists(gpio_line) -> bool:
     """
-    Проверяет экспортирована ли gpio - линия соответствующая указанному аргументу (gpio_line)
+    Проверяет экспортирована ли gpio - линия соответствующая указанному аргументу (gpio_line). Проверка выполняется
+    по реестру registry без обращения к файловой системе
     :param gpio_line: gpio - линия для которой осуществляется проверка
     :return:
         True - если линия экспортирована
-        False - если линия не экспортирована (файл не существует)
+        False - если линия не экспортирована
     """
-    if os.path.exists(f"/sys/class/gpio/gpio{gpio_line}"):
-        return True
-    else:
-        return False
+    return registry.exported(gpio_line)
 
 
 def gpio_export(gpio_line) -> None:
@@ -71,7 +334,8 @@ def gpio_export(gpio_line) -> None:
     if gpio_exists(gpio_line):
         raise ValueError
     else:
-        unsafe_write(f"/sys/class/gpio/export", gpio_line)
+        backend.export(gpio_line)
+        registry.add(gpio_line)
 
 
 def gpio_unexport(gpio_line) -> None:
@@ -81,7 +345,21 @@ def gpio_unexport(gpio_line) -> None:
     if not gpio_exists(gpio_line):
         raise ValueError
     else:
-        unsafe_write(f"/sys/class/gpio/unexport", gpio_line)
+        backend.unexport(gpio_line)
+        registry.remove(gpio_line)
+
+
+def gpio_configure(gpio_line, direction: str = None, edge: str = None) -> None:
+    """
+    Записывает direction и edge экспортированной линии. Значения, совпадающие с записанными ранее (по реестру),
+    повторно не записываются. None -- атрибут не изменяется
+    """
+    if direction is not None and registry.get(gpio_line, 'direction') != direction:
+        unsafe_write(f"{backend.line_path(gpio_line)}direction", direction)
+        registry.set(gpio_line, 'direction', direction)
+    if edge is not None and registry.get(gpio_line, 'edge') != edge:
+        check_write(f"{backend.line_path(gpio_line)}edge", edge)
+        registry.set(gpio_line, 'edge', edge)
 
 
 def gpio_try_open(gpio_line: int, direction: str = 'in', edge: str = None) -> bool:
@@ -96,9 +374,7 @@ def gpio_try_open(gpio_line: int, direction: str = 'in', edge: str = None) -> bo
             raise ValueError
         else:
             gpio_export(gpio_line)
-            unsafe_write(f"/sys/class/gpio/gpio{gpio_line}/direction", direction)
-            if edge is not None:
-                check_write(f"/sys/class/gpio/gpio{gpio_line}/edge", edge)
+            gpio_configure(gpio_line, direction, edge)
         return True
 
 
@@ -110,9 +386,7 @@ def gpio_open(gpio_line: int, direction: str = 'in', edge: str = None) -> bool:
         raise ValueError
     else:
         gpio_export(gpio_line)
-        unsafe_write(f"/sys/class/gpio/gpio{gpio_line}/direction", direction)
-        if edge is not None:
-            check_write(f"/sys/class/gpio/gpio{gpio_line}/edge", edge)
+        gpio_configure(gpio_line, direction, edge)
 
 
 def gpio_try_close(gpio_line, off_value=False) -> bool:
@@ -124,7 +398,7 @@ def gpio_try_close(gpio_line, off_value=False) -> bool:
         return False
     else:
         if off_value:
-            unsafe_write(f"/sys/class/gpio/gpio{gpio_line}/value", 0)
+            unsafe_write(f"{backend.line_path(gpio_line)}value", 0)
         gpio_unexport(gpio_line)
         return True
 
@@ -135,23 +409,108 @@ def gpio_close(gpio_line, off_value=False) -> None:
     на 0.
     """
     if off_value:
-        check_write(f"/sys/class/gpio/gpio{gpio_line}/value", 0)
+        check_write(f"{backend.line_path(gpio_line)}value", 0)
     gpio_unexport(gpio_line)
 
 
+def wait_writable(path: str, timeout: float = 1.0, delay: float = 0.001) -> float:
+    """
+    Ожидает, пока файл станет доступен для записи (после экспорта udev меняет права на атрибуты линии не сразу).
+    Проверки выполняются с экспоненциально растущей паузой, начиная с delay
+    :param path: путь к файлу
+    :param timeout: максимальное время ожидания в секундах
+    :param delay: начальная пауза между проверками
+    :return: время ожидания в секундах
+    """
+    start = time.monotonic()
+    while not os.access(path, os.W_OK):
+        elapsed = time.monotonic() - start
+        if elapsed >= timeout:
+            raise TimeoutError(f"{path} недоступен для записи")
+        time.sleep(min(delay, timeout - elapsed))
+        delay *= 2
+    return time.monotonic() - start
+
+
+def gpio_startup(gpio_line: int, direction: str = 'in', edge: str = None, timeout: float = 1.0) -> Startup:
+    """
+    Экспортирует и настраивает линию, дожидаясь доступности атрибутов direction и edge для записи. Если настроить
+    линию не удалось -- экспорт отменяется
+    :return: время этапов запуска
+    """
+    if direction not in ['in', 'out'] or edge not in ['both', 'falling', 'rising', 'none', None]:
+        raise ValueError
+    start = time.monotonic()
+    gpio_export(gpio_line)
+    exported = time.monotonic()
+    try:
+        wait_writable(f"{backend.line_path(gpio_line)}direction", timeout)
+        if edge is not None:
+            wait_writable(f"{backend.line_path(gpio_line)}edge", timeout)
+        ready = time.monotonic()
+        gpio_configure(gpio_line, direction, edge)
+    except Exception:
+        gpio_try_close(gpio_line)
+        raise
+    end = time.monotonic()
+    return Startup(exported - start, ready - exported, end - ready, end - start)
+
+
+def open_many(specs, timeout: float = 1.0, workers: int = 16) -> dict:
+    """
+    Параллельно экспортирует и настраивает несколько линий. Если хотя бы одна линия не открылась -- уже открытые
+    этим вызовом линии закрываются, исключение передается дальше
+    :param specs: последовательность (gpio_line, direction, edge); direction и edge можно не указывать
+    :param timeout: максимальное время ожидания доступности атрибутов каждой линии
+    :param workers: количество потоков
+    :return: словарь gpio_line -> Startup
+    """
+    specs = [tuple(spec) for spec in specs]
+    # Реестр заполняется до запуска потоков
+    registry.seed()
+    result = {}
+    error = None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(specs)))) as pool:
+        futures = {pool.submit(gpio_startup, *spec, timeout=timeout): spec[0] for spec in specs}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result[futures[future]] = future.result()
+            except Exception as exc:
+                error = error or exc
+    if error is not None:
+        for gpio_line in result:
+            gpio_try_close(gpio_line)
+        raise error
+    return result
+
+
 class Device:
     """
     Базовый класс для работы с GPIO
     """
-    def __init__(self, gpio_line: int):
+    def __init__(self, gpio_line: int, cached: bool = False):
+        """
+        :param gpio_line: SYSFSID/GPIO линия
+        :param cached: если True -- файл value остается открытым между open() и close(), запись значения
+        осуществляется одним системным вызовом pwrite без повторного открытия файла
+        """
         self.gpio_line = gpio_line
-        self.path = f"/sys/class/gpio/gpio{gpio_line}/"
+        self.cached = cached
+        self.fd = None
+        # Линия открыта (open() без close()); fd задан только для cached-устройств
+        self.opened = False
+
+    @property
+    def path(self) -> str:
+        return backend.line_path(self.gpio_line)
 
     def open(self, direction, edge=None):
-        gpio_open(self.gpio_line, direction, edge)
+        backend.request(self, direction, edge)
+        self.opened = True
 
     def close(self, off_value=False):
-        gpio_try_close(self.gpio_line, off_value)
+        backend.release(self, off_value)
+        self.opened = False
 
     def __repr__(self):
         return f"Led: GPIO/SYSFSID : {self.gpio_line}"
@@ -164,8 +523,8 @@ class Led(Device):
     """
     Класс для управления подключенными по gpio светодиодами
     """
-    def __init__(self, gpio_line: int):
-        super().__init__(gpio_line)
+    def __init__(self, gpio_line: int, cached: bool = False):
+        super().__init__(gpio_line, cached)
         self.__value = 0
 
     @property
@@ -176,7 +535,9 @@ class Led(Device):
     def value(self, var):
         if var in [0, 1]:
             self.__value = var
-            unsafe_write(f"{self.path}value", self.value)
+            backend.write(self, var)
+            for hook in output_hooks:
+                hook(self, var)
         else:
             raise ValueError("Недопустимое значение состояния светодиода!")
 
@@ -186,6 +547,23 @@ class Led(Device):
         """
         self.value = 1 if self.value == 0 else 0
 
+    def update(self, var) -> None:
+        """
+        Обновляет сохраненное значение без записи в линию. Используется, когда значение уже записано групповой
+        операцией backend
+        """
+        self.__value = var
+
+    async def write(self, var) -> None:
+        """
+        Запись значения из цикла событий asyncio. При открытом файле value (cached) запись выполняется одним pwrite
+        на месте, иначе open/write/close выносится в пул потоков, чтобы не блокировать цикл событий.
+        """
+        if self.fd is not None:
+            self.value = var
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, setattr, self, 'value', var)
+
     def __enter__(self):
         self.open('out')
         return self
@@ -204,9 +582,25 @@ class Button(Device):
     """
     Класс для управления подключенными по gpio кнопками
     """
-    def __init__(self, gpio_line, edge: str = "both"):
-        super().__init__(gpio_line)
+    def __init__(self, gpio_line, edge: str = "both", cached: bool = False, debounce: float = 0,
+                 history: int = 64):
+        """
+        :param gpio_line: SYSFSID/GPIO линия
+        :param edge: состояние edge -- rising, both и т.д.
+        :param cached: держать файл value открытым между open() и close()
+        :param debounce: время в секундах, в течение которого после принятого события повторные срабатывания
+        считаются дребезгом и игнорируются
+        :param history: размер кольцевого буфера принятых событий (events)
+        """
+        super().__init__(gpio_line, cached)
         self.edge = edge
+        self.debounce = debounce
+        self.events = collections.deque(maxlen=history)
+        # Количество срабатываний, отброшенных как дребезг
+        self.bounces = 0
+        self.__last = None
+        # epoll для asyncio: сам дескриптор epoll становится доступным для чтения при событии на линии
+        self.__epoll = None
 
     def __enter__(self):
         self.open("in", self.edge)
@@ -215,22 +609,497 @@ class Button(Device):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
-    def click(self) -> bool:
+    def close(self, off_value=False):
+        if self.__epoll is not None:
+            self.__epoll.close()
+            self.__epoll = None
+        super().close(off_value)
+
+    def read(self) -> int:
+        """
+        Считывает текущее значение линии. При открытом файле value (cached) -- одним вызовом pread
+        """
+        return backend.read(self)
+
+    def watch(self) -> tuple:
+        """
+        Подготавливает ожидание события открытой кнопки (см. SysfsBackend.watch)
+        :return: (дескриптор, маска событий) для регистрации в epoll
+        """
+        return backend.watch(self.gpio_line, self.fd)
+
+    def acknowledge(self) -> Edge:
+        """
+        Сбрасывает признак события после срабатывания epoll на дескрипторе watch()
+        :return: событие; None -- срабатывание без события на линии
+        """
+        return backend.acknowledge(self.gpio_line, self.fd)
+
+    def accept(self, value: int, timestamp: float = None) -> bool:
+        """
+        Фильтр дребезга. Событие принимается, если с предыдущего принятого события прошло не меньше debounce секунд;
+        принятое событие добавляется в буфер events.
+        :param value: значение линии, считанное при срабатывании
+        :param timestamp: время срабатывания по time.monotonic(), по умолчанию -- текущее
+        :return: True если событие принято, False если отброшено как дребезг
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.__last is not None and timestamp - self.__last < self.debounce:
+            self.bounces += 1
+            accepted = False
+        else:
+            self.__last = timestamp
+            self.events.append(Edge(timestamp, value))
+            accepted = True
+        for hook in edge_hooks:
+            hook(self, value, timestamp, accepted)
+        return accepted
+
+    def click(self, timeout: float = None) -> bool:
         """
         Пассивное ожидание нажатия кнопки
-        :return: Возвращает True если кнопка нажата
-        Примечание: в следующей версии будет добавлен возврат False, в случае если кнопка не нажата в течении
-        определенного промежутка времени
+        :param timeout: время ожидания в секундах, None -- без ограничения
+        :return: Возвращает True если кнопка нажата, False если кнопка не нажата в течение timeout секунд
         """
-        with open(f'{self.path}value', 'r') as reader:
-            reader.read()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        fd = self.fd if self.fd is not None else os.open(f'{self.path}value', os.O_RDONLY)
+        try:
             with select.epoll() as event:
-                event.register(reader.fileno(), select.EPOLLPRI)
-                event.poll()
-                return True
+                event.register(*backend.watch(self.gpio_line, fd))
+                while True:
+                    if deadline is None:
+                        remaining = -1
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                    if not event.poll(remaining):
+                        return False
+                    edge = backend.acknowledge(self.gpio_line, fd)
+                    if self.accept(edge.value, edge.timestamp):
+                        return True
+        finally:
+            if fd != self.fd:
+                os.close(fd)
+
+    def __on_edge(self, future):
+        if self.__epoll.poll(0):
+            edge = backend.acknowledge(self.gpio_line, self.fd)
+            if self.accept(edge.value, edge.timestamp) and not future.done():
+                future.set_result(edge.value)
+
+    async def __edge(self, timeout):
+        loop = asyncio.get_running_loop()
+        if self.fd is None:
+            self.fd = os.open(f"{self.path}value", os.O_RDONLY)
+        if self.__epoll is None:
+            self.__epoll = select.epoll()
+            self.__epoll.register(*backend.watch(self.gpio_line, self.fd))
+        future = loop.create_future()
+        fd = self.__epoll.fileno()
+        loop.add_reader(fd, self.__on_edge, future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            loop.remove_reader(fd)
+
+    async def wait_edge(self, timeout: float = None) -> bool:
+        """
+        Ожидание нажатия кнопки в цикле событий asyncio (без блокировки потока)
+        :param timeout: время ожидания в секундах, None -- без ограничения
+        :return: True если кнопка нажата, False если время ожидания истекло
+        """
+        return await self.__edge(timeout) is not None
+
+    async def edges(self):
+        """
+        Асинхронный поток событий: значение линии, считанное при каждом срабатывании edge
+            async for value in button.edges(): ...
+        """
+        while True:
+            yield await self.__edge(None)
 
     def __repr__(self):
         return f"Button: GPIO/SYSFSID : {self.gpio_line}"
 
     def __str__(self):
         return f"Button GPIO/SYSFSID : {self.gpio_line}"
+
+
+class ButtonMultiplexer:
+    """
+    Класс для ожидания нажатий любого количества кнопок в одном потоке. Все файлы value остаются открытыми и
+    зарегистрированными в одном epoll на все время работы.
+    """
+    def __init__(self, buttons=()):
+        """
+        :param buttons: кнопки, которые будут открыты вместе с мультиплексором
+        """
+        self.power_on = True
+        # Очередь событий (button, value) для кнопок без обработчика
+        self.events = queue.Queue()
+        self.epoll = None
+        self.__handlers = {}
+        # Кнопки, открытые самим мультиплексором: только они закрываются в remove()/close()
+        self.__opened = set()
+        # Открытые без cached кнопки, для которых мультиплексор открыл только файл value
+        self.__files = set()
+        self.__pending = [(button, None) for button in buttons]
+        self.__wake_reader, self.__wake_writer = None, None
+
+    def add(self, button: Button, callback=None) -> None:
+        """
+        Добавляет кнопку. Если мультиплексор уже открыт -- кнопка открывается и регистрируется сразу.
+        :param button: кнопка
+        :param callback: обработчик callback(button, value); если не задан -- событие помещается в очередь events
+        """
+        if self.epoll is None:
+            self.__pending.append((button, callback))
+        else:
+            self.__register(button, callback)
+
+    def __register(self, button, callback):
+        # Уже открытая кнопка (например, полученная из pinmap.PinMap) регистрируется без повторного открытия
+        if not button.opened:
+            button.cached = True
+            button.open("in", button.edge)
+            self.__opened.add(button)
+        elif button.fd is None:
+            button.fd = os.open(f"{button.path}value", os.O_RDONLY)
+            self.__files.add(button)
+        fd, mask = button.watch()
+        self.__handlers[fd] = (button, callback)
+        self.epoll.register(fd, mask | select.EPOLLERR)
+
+    def remove(self, button: Button) -> None:
+        """Удаляет кнопку; кнопка закрывается, если ее открыл мультиплексор"""
+        self.__pending = [(b, c) for b, c in self.__pending if b is not button]
+        for fd, (registered, _) in list(self.__handlers.items()):
+            if registered is button:
+                self.epoll.unregister(fd)
+                del self.__handlers[fd]
+                if button in self.__opened:
+                    self.__opened.discard(button)
+                    button.close()
+                elif button in self.__files:
+                    self.__files.discard(button)
+                    os.close(button.fd)
+                    button.fd = None
+
+    def poll(self, timeout: float = None) -> list:
+        """
+        Ожидает события на любой из кнопок и вызывает соответствующие обработчики
+        :param timeout: время ожидания в секундах, None -- без ограничения
+        :return: список кнопок, на которых произошло событие
+        """
+        fired = []
+        for fd, _ in self.epoll.poll(-1 if timeout is None else timeout):
+            if fd == self.__wake_reader:
+                os.read(fd, 64)
+                continue
+            button, callback = self.__handlers[fd]
+            edge = button.acknowledge()
+            if edge is None or not button.accept(edge.value, edge.timestamp):
+                continue
+            fired.append(button)
+            if callback is None:
+                self.events.put((button, edge.value))
+            else:
+                callback(button, edge.value)
+        return fired
+
+    def run(self) -> None:
+        """Обработка событий до вызова stop()"""
+        while self.power_on:
+            self.poll()
+
+    def stop(self) -> None:
+        """Останавливает run(). Может вызываться из другого потока или из обработчика."""
+        self.power_on = False
+        if self.__wake_writer is not None:
+            os.write(self.__wake_writer, b'\0')
+
+    def open(self):
+        self.power_on = True
+        self.epoll = select.epoll()
+        self.__wake_reader, self.__wake_writer = os.pipe()
+        self.epoll.register(self.__wake_reader, select.EPOLLIN)
+        pending, self.__pending = self.__pending, []
+        try:
+            for button, callback in pending:
+                self.__register(button, callback)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        # Кнопки сохраняются и будут заново зарегистрированы при следующем open()
+        handlers = list(self.__handlers.values())
+        for button, _ in handlers:
+            self.remove(button)
+        self.__pending = handlers + self.__pending
+        if self.epoll is not None:
+            self.epoll.close()
+            os.close(self.__wake_reader)
+            os.close(self.__wake_writer)
+        self.epoll = None
+        self.__wake_reader, self.__wake_writer = None, None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"ButtonMultiplexer: GPIO/SYSFSID : {[button.gpio_line for button, _ in self.__handlers.values()]}"
+
+    def __str__(self):
+        return f"ButtonMultiplexer: GPIO/SYSFSID : {[button.gpio_line for button, _ in self.__handlers.values()]}"
+
+
+class LineGroup:
+    """
+    Класс для одновременного управления группой светодиодов. Состояние группы задается битовой маской (бит i
+    соответствует i-й линии) либо последовательностью значений 0/1. Записываются только изменившиеся линии.
+    """
+    def __init__(self, gpio_lines):
+        """
+        :param gpio_lines: последовательность SYSFSID/GPIO линий, порядок задает номера битов маски
+        """
+        self.leds = [Led(gpio_line, cached=True) for gpio_line in gpio_lines]
+        self.__state = 0
+
+    @property
+    def value(self) -> int:
+        return self.__state
+
+    @value.setter
+    def value(self, var):
+        self.write(var)
+
+    def mask(self, states) -> int:
+        """
+        Преобразует последовательность значений 0/1 (bytes, bytearray, array, list) в битовую маску
+        """
+        if isinstance(states, int):
+            if states < 0 or states >> len(self.leds):
+                raise ValueError("Маска выходит за пределы группы!")
+            return states
+        if len(states) != len(self.leds):
+            raise ValueError("Количество значений не совпадает с количеством линий!")
+        result = 0
+        for i, state in enumerate(states):
+            if state not in (0, 1):
+                raise ValueError("Недопустимое значение состояния светодиода!")
+            result |= state << i
+        return result
+
+    def write(self, states) -> int:
+        """
+        Записывает новое состояние группы, изменяя только те линии, значение которых отличается от последнего
+        записанного
+        :param states: битовая маска или последовательность значений 0/1
+        :return: количество измененных линий
+        """
+        new = self.mask(states)
+        changed = new ^ self.__state
+        if changed:
+            backend.write_group(self.leds, new, changed)
+        self.__state = new
+        return bin(changed).count('1')
+
+    def read(self) -> int:
+        """Считывает фактические значения всех линий группы в битовую маску"""
+        return backend.read_group(self.leds)
+
+    def open(self):
+        backend.request_group(self.leds)
+        self.__state = 0
+        backend.write_group(self.leds, 0, (1 << len(self.leds)) - 1)
+
+    def close(self, off_value=True):
+        backend.release_group(self.leds, off_value)
+        self.__state = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(True)
+
+    def __len__(self):
+        return len(self.leds)
+
+    def __getitem__(self, item):
+        return self.leds[item]
+
+    def __repr__(self):
+        return f"LineGroup: GPIO/SYSFSID : {[led.gpio_line for led in self.leds]} value : {self.value:#x}"
+
+    def __str__(self):
+        return f"LineGroup: GPIO/SYSFSID : {[led.gpio_line for led in self.leds]} value : {self.value:#x}"
+
+
+class Instrumentation:
+    """
+    Счетчики операций, ошибок и гистограммы задержек по операциям и линиям. Включается enable_instrumentation():
+    функции и методы модуля подменяются обертками с замером времени, поэтому выключенная инструментация не стоит
+    ничего. Границы корзин гистограммы -- от 1 мкс до ~1 с со множителем 2.
+    """
+    BOUNDS = tuple(1000 * 2 ** i for i in range(21))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (operation, line) -> [count, errors, total_ns, корзины...]
+        self.series = {}
+
+    def record(self, operation: str, line, elapsed: int, error: bool = False) -> None:
+        """
+        :param operation: имя операции
+        :param line: gpio - линия или имя файла (export, unexport)
+        :param elapsed: длительность в наносекундах
+        :param error: операция завершилась исключением
+        """
+        with self.lock:
+            series = self.series.get((operation, line))
+            if series is None:
+                series = self.series[(operation, line)] = [0, 0, 0] + [0] * (len(self.BOUNDS) + 1)
+            series[0] += 1
+            series[1] += error
+            series[2] += elapsed
+            series[3 + bisect.bisect_left(self.BOUNDS, elapsed)] += 1
+
+    def wrap(self, operation: str, function, line):
+        """
+        Обертка функции с замером времени
+        :param line: функция, возвращающая метку линии по аргументам вызова
+        """
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                self.record(operation, line(*args, **kwargs), time.perf_counter_ns() - start, True)
+                raise
+            self.record(operation, line(*args, **kwargs), time.perf_counter_ns() - start)
+            return result
+        wrapper.__wrapped__ = function
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def stats(self) -> list:
+        """
+        Снимок статистики: список серий с количеством операций, ошибок, суммарным временем и накопительными
+        значениями корзин гистограммы (граница в секундах -> количество операций не дольше границы)
+        """
+        with self.lock:
+            items = [(key, list(series)) for key, series in self.series.items()]
+        result = []
+        for (operation, line), series in sorted(items, key=lambda item: (item[0][0], str(item[0][1]))):
+            buckets, cumulative = {}, 0
+            for bound, count in zip(self.BOUNDS, series[3:]):
+                cumulative += count
+                buckets[bound / 1e9] = cumulative
+            result.append({'operation': operation, 'line': line, 'count': series[0], 'errors': series[1],
+                           'sum_seconds': series[2] / 1e9, 'buckets': buckets})
+        return result
+
+    def json(self) -> str:
+        return json.dumps(self.stats())
+
+    def prometheus(self) -> str:
+        """Статистика в текстовом формате Prometheus"""
+        lines = ["# TYPE pygpio_operations_total counter", "# TYPE pygpio_errors_total counter",
+                 "# TYPE pygpio_latency_seconds histogram"]
+        for series in self.stats():
+            labels = f'operation="{series["operation"]}",line="{series["line"]}"'
+            lines.append(f'pygpio_operations_total{{{labels}}} {series["count"]}')
+            lines.append(f'pygpio_errors_total{{{labels}}} {series["errors"]}')
+            for bound, count in series['buckets'].items():
+                lines.append(f'pygpio_latency_seconds_bucket{{{labels},le="{bound:g}"}} {count}')
+            lines.append(f'pygpio_latency_seconds_bucket{{{labels},le="+Inf"}} {series["count"]}')
+            lines.append(f'pygpio_latency_seconds_sum{{{labels}}} {series["sum_seconds"]}')
+            lines.append(f'pygpio_latency_seconds_count{{{labels}}} {series["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self.lock:
+            self.series.clear()
+
+    def __repr__(self):
+        return f"Instrumentation: {len(self.series)} series"
+
+    def __str__(self):
+        return f"Instrumentation: {len(self.series)} series"
+
+
+instrumentation = None
+originals = {}
+
+
+def path_line(path: str, value=None):
+    """Метка линии для записи в файл sysfs: номер линии для gpioN/attr, иначе -- имя файла (export, unexport)"""
+    directory, name = os.path.split(path)
+    parent = os.path.basename(directory)
+    if parent.startswith("gpio") and parent[4:].isdigit():
+        return int(parent[4:])
+    return name
+
+
+def device_line(device, *args, **kwargs):
+    return device.gpio_line
+
+
+def enable_instrumentation() -> Instrumentation:
+    """
+    Включает сбор статистики для unsafe_write, check_write, Device.open/close, Led.value и Button.click
+    :return: объект статистики (повторный вызов возвращает тот же объект)
+    """
+    global instrumentation, unsafe_write, check_write
+    if instrumentation is not None:
+        return instrumentation
+    instrumentation = Instrumentation()
+    originals.update(unsafe_write=unsafe_write, check_write=check_write, open=Device.open, close=Device.close,
+                     value=Led.value, click=Button.click)
+    unsafe_write = instrumentation.wrap('write', unsafe_write, path_line)
+    check_write = instrumentation.wrap('write', check_write, path_line)
+    Device.open = instrumentation.wrap('open', Device.open, device_line)
+    Device.close = instrumentation.wrap('close', Device.close, device_line)
+    Led.value = property(Led.value.fget, instrumentation.wrap('led_value', Led.value.fset, device_line))
+    Button.click = instrumentation.wrap('click', Button.click, device_line)
+    return instrumentation
+
+
+def disable_instrumentation() -> None:
+    """Выключает сбор статистики и восстанавливает исходные функции"""
+    global instrumentation, unsafe_write, check_write
+    if instrumentation is None:
+        return
+    unsafe_write, check_write = originals['unsafe_write'], originals['check_write']
+    Device.open, Device.close = originals['open'], originals['close']
+    Led.value, Button.click = originals['value'], originals['click']
+    originals.clear()
+    instrumentation = None
+
+
+def stats(output: str = None):
+    """
+    Снимок статистики инструментации
+    :param output: None -- список серий, 'json' -- строка JSON, 'prometheus' -- текстовый формат Prometheus
+    :return: снимок; если инструментация выключена -- пустой снимок
+    """
+    current = instrumentation if instrumentation is not None else Instrumentation()
+    if output is None:
+        return current.stats()
+    elif output == 'json':
+        return current.json()
+    elif output == 'prometheus':
+        return current.prometheus()
+    else:
+        raise ValueError
@@ -0,0 +1,213 @@
+import pygpiolib as gpio
+import bisect
+import collections
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import argparse
+import sys
+
+# Заголовок файла: сигнатура, размер записи, емкость кольца (записей), количество записей за все время
+HEADER = struct.Struct("=4sIQQ8x")
+# Запись: время по time.monotonic в наносекундах, линия, вид события, значение
+RECORD = struct.Struct("=QIBB2x")
+
+MAGIC = b'PGRC'
+
+# Виды событий
+EDGE = 1        # событие кнопки принято (Button.accept)
+BOUNCE = 2      # событие кнопки отброшено как дребезг
+OUTPUT = 3      # запись значения светодиода (Led.value)
+
+KINDS = {EDGE: 'edge', BOUNCE: 'bounce', OUTPUT: 'output'}
+
+# Границы корзин гистограммы интервалов в наносекундах: от 1 мкс до ~36 минут
+BOUNDS = tuple(1000 * 2 ** i for i in range(32))
+
+Record = collections.namedtuple('Record', ['timestamp', 'line', 'kind', 'value'])
+
+
+class Recorder:
+    """
+    Запись событий в кольцевой файл, отображенный в память (mmap). Записи фиксированного размера, после заполнения
+    кольца самые старые записи перезаписываются. Запись одного события -- упаковка структуры в отображенную память без
+    системных вызовов, поэтому ее можно выполнять на пути Button/Led (см. attach).
+        with Recorder('/tmp/edges.bin') as recorder:
+            recorder.attach()
+            ...
+    """
+    def __init__(self, path: str, capacity: int = 65536):
+        """
+        :param path: путь к файлу записи, существующий файл перезаписывается
+        :param capacity: емкость кольца в записях
+        """
+        if capacity <= 0:
+            raise ValueError("Емкость должна быть больше нуля!")
+        self.path = path
+        self.capacity = capacity
+        self.count = 0
+        self.map = None
+        self.__lock = threading.Lock()
+        self.__attached = False
+
+    def open(self):
+        size = HEADER.size + RECORD.size * self.capacity
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.count = 0
+        HEADER.pack_into(self.map, 0, MAGIC, RECORD.size, self.capacity, 0)
+
+    def close(self):
+        self.detach()
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+
+    def record(self, line: int, kind: int, value: int, timestamp: int = None) -> None:
+        """
+        Добавляет запись
+        :param timestamp: время по time.monotonic_ns(), по умолчанию -- текущее
+        """
+        if timestamp is None:
+            timestamp = time.monotonic_ns()
+        with self.__lock:
+            RECORD.pack_into(self.map, HEADER.size + RECORD.size * (self.count % self.capacity),
+                             timestamp, line, kind, value)
+            self.count += 1
+            struct.pack_into("=Q", self.map, 16, self.count)
+
+    def attach(self) -> None:
+        """
+        Подключает запись к событиям всех кнопок (принятые события и дребезг, gpio.add_hook edge) и записям Led.value
+        всех светодиодов (output)
+        """
+        if self.__attached:
+            return
+        self.__attached = True
+        gpio.add_hook('edge', self.__edge)
+        gpio.add_hook('output', self.__output)
+
+    def detach(self) -> None:
+        """Отключает запись от Button/Led"""
+        if self.__attached:
+            gpio.remove_hook('edge', self.__edge)
+            gpio.remove_hook('output', self.__output)
+            self.__attached = False
+
+    def __edge(self, button, value, timestamp, accepted):
+        self.record(button.gpio_line, EDGE if accepted else BOUNCE, value, int(timestamp * 1e9))
+
+    def __output(self, led, value):
+        self.record(led.gpio_line, OUTPUT, value)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"Recorder: path : {self.path} capacity : {self.capacity} count : {self.count}"
+
+    def __str__(self):
+        return f"Recorder: path : {self.path} capacity : {self.capacity} count : {self.count}"
+
+
+def read(path: str, chunk: int = 4096):
+    """
+    Читает записи файла Recorder от самой старой к самой новой, по chunk записей за одно чтение
+    :return: генератор Record
+    """
+    with open(path, 'rb') as file:
+        magic, size, capacity, count = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or size != RECORD.size:
+            raise ValueError("Не файл записи событий!")
+        stored = min(count, capacity)
+        first = count % capacity if count > capacity else 0
+        # Кольцо читается двумя участками: от самой старой записи до конца файла и от начала до самой новой
+        for start, length in ((first, stored - first), (0, first if count > capacity else 0)):
+            file.seek(HEADER.size + RECORD.size * start)
+            while length > 0:
+                n = min(chunk, length)
+                for record in RECORD.iter_unpack(file.read(RECORD.size * n)):
+                    yield Record(*record)
+                length -= n
+
+
+def histogram(counts: list) -> list:
+    """Непустые корзины гистограммы: верхняя граница в секундах (None -- без границы) и количество"""
+    return [{'le': BOUNDS[i] / 1e9 if i < len(BOUNDS) else None, 'count': count}
+            for i, count in enumerate(counts) if count]
+
+
+def analyze(records) -> dict:
+    """
+    Статистика по потоку записей за один проход
+    :param records: последовательность Record в порядке записи
+    :return: длительность записи и по каждой линии: количество событий и нажатий (принятых событий со значением 1),
+    частота нажатий в секунду, гистограмма интервалов между принятыми событиями, количество и доля дребезга,
+    интервалы от принятого события до дребезга, количество записей светодиода
+    """
+    lines = {}
+    first = last = None
+    for timestamp, line, kind, value in records:
+        if first is None:
+            first = timestamp
+        last = timestamp
+        state = lines.get(line)
+        if state is None:
+            state = lines[line] = {'edges': 0, 'presses': 0, 'bounces': 0, 'outputs': 0, 'previous': None,
+                                   'intervals': [0] * (len(BOUNDS) + 1), 'bounce_total': 0, 'bounce_max': 0}
+        if kind == EDGE:
+            state['edges'] += 1
+            state['presses'] += value == 1
+            if state['previous'] is not None:
+                state['intervals'][bisect.bisect_left(BOUNDS, timestamp - state['previous'])] += 1
+            state['previous'] = timestamp
+        elif kind == BOUNCE:
+            state['bounces'] += 1
+            if state['previous'] is not None:
+                delay = timestamp - state['previous']
+                state['bounce_total'] += delay
+                state['bounce_max'] = max(state['bounce_max'], delay)
+        elif kind == OUTPUT:
+            state['outputs'] += 1
+    duration = (last - first) / 1e9 if first is not None else 0.0
+    result = {}
+    for line, state in sorted(lines.items()):
+        events = state['edges'] + state['bounces']
+        result[line] = {'edges': state['edges'],
+                        'presses': state['presses'],
+                        'press_rate': state['presses'] / duration if duration else 0.0,
+                        'intervals': histogram(state['intervals']),
+                        'bounces': state['bounces'],
+                        'bounce_ratio': state['bounces'] / events if events else 0.0,
+                        'bounce_delay_mean': (state['bounce_total'] / state['bounces'] / 1e9
+                                              if state['bounces'] else 0.0),
+                        'bounce_delay_max': state['bounce_max'] / 1e9,
+                        'outputs': state['outputs']}
+    return {'duration': duration, 'lines': result}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    # файл записи событий (Recorder)
+    parser.add_argument('path', type=str)
+    # -o файл для результатов в формате JSON, по умолчанию -- стандартный вывод
+    parser.add_argument('-o', '--output', type=str, default=None)
+    arg = parser.parse_args(sys.argv[1:])
+    report = analyze(read(arg.path))
+    if arg.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(arg.output, 'w') as wr:
+            json.dump(report, wr, indent=2)
@@ -0,0 +1,281 @@
+import pygpiolib as gpio
+import collections
+import contextlib
+import json
+import os
+import socket
+import threading
+import time
+import argparse
+import sys
+
+# Событие сеанса: время от начала записи в наносекундах, вид, ключ, значение.
+#   edge   -- событие кнопки (Button.accept): линия, значение
+#   output -- запись значения светодиода (Led.value): линия, значение
+#   write  -- запись в файл sysfs (unsafe_write/check_write): путь относительно корня backend, значение
+#   send   -- отправленный пакет UDP: порт получателя, данные (hex)
+#   recv   -- принятый пакет UDP: локальный порт, данные (hex)
+Event = collections.namedtuple('Event', ['time', 'kind', 'key', 'value'])
+
+KINDS = ('edge', 'output', 'write', 'send', 'recv')
+
+
+# Включенные записи. Методы socket.socket подменяются при включении первой записи и восстанавливаются при
+# отключении последней, поэтому записи можно включать и отключать в любом порядке
+captures = ()
+originals = {}
+lock = threading.Lock()
+
+
+def udp(sock) -> bool:
+    return sock.family == socket.AF_INET and sock.type == socket.SOCK_DGRAM
+
+
+def notify(kind: str, key, value) -> None:
+    for capture in captures:
+        capture.add(kind, key, value)
+
+
+def captured_send(sock, data, *args):
+    result = originals['send'](sock, data, *args)
+    if captures and udp(sock):
+        notify('send', sock.getpeername()[1], bytes(data).hex())
+    return result
+
+
+def captured_sendto(sock, data, *args):
+    result = originals['sendto'](sock, data, *args)
+    if captures and udp(sock):
+        notify('send', args[-1][1], bytes(data).hex())
+    return result
+
+
+def captured_recv(sock, *args):
+    data = originals['recv'](sock, *args)
+    if captures and udp(sock):
+        notify('recv', sock.getsockname()[1], data.hex())
+    return data
+
+
+def captured_recvfrom(sock, *args):
+    data, address = originals['recvfrom'](sock, *args)
+    if captures and udp(sock):
+        notify('recv', sock.getsockname()[1], data.hex())
+    return data, address
+
+
+def captured_recvfrom_into(sock, buffer, *args):
+    size, address = originals['recvfrom_into'](sock, buffer, *args)
+    if captures and udp(sock):
+        notify('recv', sock.getsockname()[1], bytes(memoryview(buffer)[:size]).hex())
+    return size, address
+
+
+SOCKET_METHODS = {'send': captured_send, 'sendto': captured_sendto, 'recv': captured_recv,
+                  'recvfrom': captured_recvfrom, 'recvfrom_into': captured_recvfrom_into}
+
+
+class Capture:
+    """
+    Запись сеанса: события кнопок, записи светодиодов и sysfs, пакеты UDP с временем по time.monotonic_ns.
+    События GPIO принимаются наблюдателями pygpiolib (gpio.add_hook), пакеты -- через методы socket.socket для сокетов
+    UDP, поэтому записываются все потоки процесса, включая цикл событий asyncio. Вызовы, начатые до attach()
+    (например, блокирующий recvfrom уже запущенного сервера), не записываются -- запись включается до запуска системы.
+        with Capture() as capture:
+            ...
+        save(capture.events, 'session.jsonl')
+    """
+    def __init__(self):
+        self.events = []
+        self.start = None
+        self.attached = False
+        self.__local = threading.local()
+
+    def add(self, kind: str, key, value, timestamp: int = None) -> None:
+        """
+        :param timestamp: время по time.monotonic_ns(), по умолчанию -- текущее
+        """
+        if getattr(self.__local, 'quiet', False):
+            return
+        if timestamp is None:
+            timestamp = time.monotonic_ns()
+        self.events.append(Event(timestamp - self.start, kind, key, value))
+
+    @contextlib.contextmanager
+    def quiet(self):
+        """Действия текущего потока внутри блока не записываются (вызов событий при воспроизведении)"""
+        self.__local.quiet = True
+        try:
+            yield
+        finally:
+            self.__local.quiet = False
+
+    def attach(self) -> None:
+        global captures
+        if self.attached:
+            return
+        self.start = time.monotonic_ns()
+        self.attached = True
+        gpio.add_hook('edge', self.__edge)
+        gpio.add_hook('output', self.__output)
+        gpio.add_hook('write', self.__write)
+        with lock:
+            if not captures:
+                originals.update((name, getattr(socket.socket, name)) for name in SOCKET_METHODS)
+                for name, method in SOCKET_METHODS.items():
+                    setattr(socket.socket, name, method)
+            captures = captures + (self,)
+
+    def detach(self) -> None:
+        global captures
+        if not self.attached:
+            return
+        gpio.remove_hook('edge', self.__edge)
+        gpio.remove_hook('output', self.__output)
+        gpio.remove_hook('write', self.__write)
+        with lock:
+            captures = tuple(capture for capture in captures if capture is not self)
+            if not captures:
+                for name, method in originals.items():
+                    # Унаследованные методы (_socket.socket) восстанавливаются удалением подмены
+                    delattr(socket.socket, name)
+                    if getattr(socket.socket, name) is not method:
+                        setattr(socket.socket, name, method)
+                originals.clear()
+        self.attached = False
+
+    def __edge(self, button, value, timestamp, accepted):
+        self.add('edge', button.gpio_line, value, int(timestamp * 1e9))
+
+    def __output(self, led, value):
+        self.add('output', led.gpio_line, value)
+
+    def __write(self, path, value):
+        self.add('write', os.path.relpath(path, gpio.backend.root), str(value))
+
+    def __enter__(self):
+        self.attach()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.detach()
+
+    def __repr__(self):
+        return f"Capture: events : {len(self.events)}"
+
+    def __str__(self):
+        return f"Capture: events : {len(self.events)}"
+
+
+def save(events, path: str) -> None:
+    """Сохраняет события в файл JSON Lines, одно событие -- [время, вид, ключ, значение]"""
+    with open(path, 'w') as wr:
+        for event in events:
+            wr.write(json.dumps(list(event)) + '\n')
+
+
+def load(path: str) -> list:
+    with open(path, 'r') as reader:
+        return [Event(*json.loads(line)) for line in reader if line.strip()]
+
+
+def replay(events, sim, speed: float = 1.0, ports: dict = None, settle: float = 0.2, spin: float = 0.002,
+           capture: Capture = None) -> list:
+    """
+    Воспроизводит входные события сеанса на имитации и записывает реакцию системы. Система (серверы, клиенты,
+    LegButtonThread и т.д.) должна быть запущена на sim до вызова. События кнопок вызываются через sim.inject, принятые
+    пакеты UDP (recv) отправляются заново на порты из ports -- в том же порядке и по тому же расписанию, сжатому в speed
+    раз. Ускорение корректно для систем, реагирующих на события; собственные таймеры системы (debounce, ШИМ) не
+    ускоряются.
+    :param events: записанные события
+    :param sim: simgpio.SimulatedBackend
+    :param speed: ускорение воспроизведения
+    :param ports: локальный порт записанного пакета recv -> адрес, на который он отправляется при воспроизведении;
+    пакеты на другие порты не воспроизводятся
+    :param settle: время ожидания реакции после последнего события в секундах
+    :param spin: за сколько секунд до события ожидание сменяется активным опросом часов (см. pattern.Player)
+    :param capture: запись, включенная до запуска системы; по умолчанию -- новая запись на время воспроизведения
+    :return: события воспроизведения в шкале времени записи. События до начала воспроизведения (запуск системы при
+    capture, включенной до запуска) сохраняются со временем от начала записи -- как и в сеансе, записанном до запуска
+    системы. Остальные события отсчитываются от начала воспроизведения и приводятся к масштабу записи (умножаются на
+    speed), поэтому задержки самой системы при сравнении тоже умножаются на speed -- допустимое отклонение compare
+    нужно увеличить соответственно
+    """
+    ports = ports or {}
+    inputs = [event for event in events if event.kind == 'edge' or (event.kind == 'recv' and event.key in ports)]
+    own = capture is None
+    if own:
+        capture = Capture()
+        capture.attach()
+    # События после начала воспроизведения отсчитываются от него
+    offset = time.monotonic_ns() - capture.start
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender, capture.quiet():
+            for event in inputs:
+                deadline = capture.start + offset + int(event.time / speed)
+                delay = (deadline - time.monotonic_ns()) / 1e9 - spin
+                if delay > 0:
+                    time.sleep(delay)
+                while time.monotonic_ns() < deadline:
+                    pass
+                if event.kind == 'edge':
+                    # Значение на линии уже равно записанному (повтор или дребезг) -- сначала без события
+                    # выставляется противоположное, чтобы inject вызвал событие
+                    if sim.attribute(event.key, 'value') == str(event.value):
+                        sim.store(event.key, 1 - event.value)
+                    sim.inject(event.key, event.value)
+                else:
+                    sender.sendto(bytes.fromhex(event.value), ports[event.key])
+            time.sleep(settle)
+    finally:
+        if own:
+            capture.detach()
+    return [event if event.time < offset else event._replace(time=int((event.time - offset) * speed))
+            for event in capture.events]
+
+
+def compare(expected, actual, kinds=('output',), tolerance: float = 0.01) -> dict:
+    """
+    Сравнивает временные ряды событий: i-е событие каждого ключа записи с i-м событием воспроизведения
+    :param kinds: виды сравниваемых событий
+    :param tolerance: допустимое отклонение времени события в секундах
+    :return: по каждому ряду (вид:ключ) -- количество событий, несовпадения значений, среднее и максимальное
+    отклонение времени в секундах; список рядов с расхождениями (regressions) и общий результат ok
+    """
+    def timelines(events):
+        result = collections.defaultdict(list)
+        for event in events:
+            if event.kind in kinds:
+                result[f"{event.kind}:{event.key}"].append(event)
+        return result
+
+    left, right = timelines(expected), timelines(actual)
+    report = {}
+    regressions = []
+    for name in sorted(set(left) | set(right)):
+        a, b = left.get(name, []), right.get(name, [])
+        pairs = list(zip(a, b))
+        deltas = [(y.time - x.time) / 1e9 for x, y in pairs]
+        mismatches = sum(x.value != y.value for x, y in pairs)
+        report[name] = {'expected': len(a),
+                        'actual': len(b),
+                        'mismatches': mismatches,
+                        'delta_mean': sum(deltas) / len(deltas) if deltas else 0.0,
+                        'delta_max': max(deltas, key=abs) if deltas else 0.0}
+        if len(a) != len(b) or mismatches or (deltas and abs(report[name]['delta_max']) > tolerance):
+            regressions.append(name)
+    return {'timelines': report, 'regressions': regressions, 'ok': not regressions}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    # файлы записи и воспроизведения (JSON Lines, см. save)
+    parser.add_argument('expected', type=str)
+    parser.add_argument('actual', type=str)
+    # -k виды сравниваемых событий, -t допустимое отклонение времени в секундах
+    parser.add_argument('-k', '--kinds', type=str, nargs='+', default=['output'], choices=KINDS)
+    parser.add_argument('-t', '--tolerance', type=float, default=0.01)
+    arg = parser.parse_args(sys.argv[1:])
+    result = compare(load(arg.expected), load(arg.actual), arg.kinds, arg.tolerance)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result['ok'] else 1)
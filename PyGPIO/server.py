@@ -1,8 +1,13 @@
 import socket
 import pygpiolib as gpio
 import threading
+import asyncio
+import select
+import os
+import protocol
 import argparse
 import sys
+import traceback
 
 
 def get_ip():
@@ -11,32 +16,111 @@ def get_ip():
     return ip.getsockname()[0]
 
 
+# Команды двоичного протокола в виде чисел текстового режима
+TEXT_COMMANDS = {protocol.OP_STOP: -1, protocol.OP_SHUTDOWN: -2}
+
+
+def parse(buffer, size: int) -> int:
+    """
+    Разбирает целое число в ASCII из буфера приема без декодирования в строку
+    :param buffer: буфер (bytearray)
+    :param size: длина принятых данных
+    """
+    if size == 1 and 48 <= buffer[0] <= 57:
+        return buffer[0] - 48
+    return int(buffer[:size])
+
+
 class Architect:
-    def __init__(self, port: int, gpio_button, size: int = 1024):
+    def __init__(self, port: int, gpio_button, size: int = 1024, ip: str = None, log_every: int = 1):
+        """
+        :param port: порт сервера
+        :param gpio_button: SYSFSID/GPIO линия кнопки выключения
+        :param size: размер буфера приема
+        :param ip: адрес сервера, по умолчанию -- адрес внешнего интерфейса
+        :param log_every: печатать каждый N-й принятый пакет, 0 -- не печатать
+        """
         self.size = size
-        self.ip = get_ip()
+        self.ip = ip if ip is not None else get_ip()
         self.port = port
         self.power_on = True
+        self.log_every = log_every
+        self.received = 0
+        # Пакетов, отброшенных как некорректные (не число, обрезанный пакет, другая версия протокола)
+        self.rejected = 0
         self.button = gpio.Button(gpio_button, 'rising')
         self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
     def work(self):
         self.server.bind((self.ip, self.port))
         print("server waiting!")
+        buffer = bytearray(self.size)
         while self.power_on:
-            data, client = self.server.recvfrom(self.size)
-            data = int(data.decode('utf-8'))
-            print(f"{data} {client}")
-            # -1 отключить клиент, -2 - отключить клиент затем выключить сервер
-            if data == -1:
-                self.server.sendto(b'-1', client)
-            elif data == -2:
-                print("stop!")
-            else:
-                self.server.sendto(b'1', client)
+            # Блокирующее ожидание первого пакета, затем без блокировки разбираются все накопившиеся
+            size, client = self.server.recvfrom_into(buffer)
+            self.handle(buffer, size, client)
+            self.drain(buffer)
         self.server.close()
         print("server off")
 
+    def drain(self, buffer):
+        """Обрабатывает все пакеты, уже находящиеся в очереди сокета, без блокировки"""
+        while True:
+            try:
+                size, client = self.server.recvfrom_into(buffer, 0, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+            self.handle(buffer, size, client)
+
+    def handle(self, buffer, size: int, client):
+        try:
+            reply = self.reply(buffer, size, client)
+        except ValueError:
+            # Некорректный пакет отбрасывается, сервер продолжает работу
+            self.rejected += 1
+            return
+        if reply is not None:
+            self.server.sendto(reply, client)
+
+    def reply(self, data, size: int, client):
+        """
+        Ответ на пакет в текстовом или двоичном (protocol) формате
+        :return: ответ в том же формате или None
+        """
+        if size >= protocol.HEADER.size and data[:2] == protocol.MAGIC:
+            return self.answer_binary(memoryview(data)[:size], client)
+        return self.answer(parse(data, size), client)
+
+    def answer_binary(self, data, client):
+        """
+        Обработка двоичного пакета: каждая команда обрабатывается как число текстового режима, ответы собираются в
+        один пакет с тем же номером
+        """
+        sequence, commands = protocol.decode(data)
+        replies = []
+        for line, op, value in commands:
+            reply = self.answer(TEXT_COMMANDS.get(op, value), client)
+            if reply is not None:
+                replies.append((line, protocol.OP_STOP if reply == b'-1' else protocol.OP_ACK, 0))
+        return protocol.encode(sequence, replies) if replies else None
+
+    def answer(self, data: int, client):
+        """
+        Обработка команды клиента
+        :return: ответ клиенту или None, если отвечать не нужно
+        """
+        self.received += 1
+        if self.log_every and self.received % self.log_every == 0:
+            print(f"{data} {client}")
+        # -1 отключить клиент, -2 - отключить клиент затем выключить сервер
+        if data == -1:
+            return b'-1'
+        elif data == -2:
+            print("stop!")
+            return None
+        else:
+            return b'1'
+
     def power_off(self):
         with self.button:
             if self.button.click():
@@ -56,11 +140,128 @@ class Architect:
             self.button.close(off_value=False)
             self.server.close()
 
+    def worker(self, stop: int):
+        """
+        Рабочий процесс: собственный сокет на том же порту (SO_REUSEPORT), ядро распределяет клиентов между
+        процессами. Завершается, когда координатор закрывает канал stop
+        :param stop: дескриптор чтения канала остановки
+        """
+        self.server.close()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.server.bind((self.ip, self.port))
+        buffer = bytearray(self.size)
+        with select.epoll() as poller:
+            poller.register(self.server.fileno(), select.EPOLLIN)
+            poller.register(stop, select.EPOLLIN)
+            while self.power_on:
+                for fd, _ in poller.poll():
+                    if fd == stop:
+                        self.power_on = False
+                    else:
+                        self.drain(buffer)
+        self.server.close()
+
+    def start_workers(self, count: int, interval: float = 1.0):
+        """
+        Запускает count рабочих процессов и ожидает нажатия кнопки выключения в текущем (координаторе), после чего
+        останавливает рабочие процессы и дожидается их завершения. Раз в interval секунд координатор проверяет рабочие
+        процессы: завершившийся процесс заменяется новым
+        """
+        self.server.close()
+        reader, writer = os.pipe()
+        workers = []
+
+        def spawn():
+            pid = os.fork()
+            if pid == 0:
+                os.close(writer)
+                code = 0
+                try:
+                    self.worker(reader)
+                except BaseException:
+                    traceback.print_exc()
+                    code = 1
+                finally:
+                    os._exit(code)
+            return pid
+
+        try:
+            for _ in range(count):
+                workers.append(spawn())
+            print(f"server waiting! workers: {count}")
+            with self.button:
+                while not self.button.click(interval):
+                    for i, pid in enumerate(workers):
+                        done, status = os.waitpid(pid, os.WNOHANG)
+                        if done:
+                            print(f"worker {pid} exited with code {os.waitstatus_to_exitcode(status)}, restarting")
+                            workers[i] = spawn()
+                self.power_on = False
+                print("power button off")
+        finally:
+            # Закрытие канала будит все рабочие процессы
+            os.close(writer)
+            os.close(reader)
+            for pid in workers:
+                os.waitpid(pid, 0)
+        print("server off")
+
+    async def serve(self):
+        """
+        Работа сервера в цикле событий asyncio: пакеты обрабатывает ServerProtocol, нажатие кнопки ожидается через
+        Button.wait_edge, выключение -- без служебного пакета самому себе
+        """
+        self.server.close()
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: ServerProtocol(self),
+                                                           local_addr=(self.ip, self.port))
+        print("server waiting!")
+        try:
+            with self.button:
+                while self.power_on:
+                    if await self.button.wait_edge():
+                        self.power_on = False
+                        print("power button off")
+        finally:
+            transport.close()
+        print("server off")
+
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    """Обработка пакетов Architect в режиме asyncio"""
+    def __init__(self, architect: Architect):
+        self.architect = architect
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            reply = self.architect.reply(data, len(data), addr)
+        except ValueError:
+            self.architect.rejected += 1
+            return
+        if reply is not None:
+            self.transport.sendto(reply, addr)
+
 
 if __name__ == '__main__':
     args = argparse.ArgumentParser()
     args.add_argument('-p', '--port', type=int)
     args.add_argument('-b', '--button', type=int)
+    # -l печатать каждый N-й принятый пакет, 0 -- не печатать
+    args.add_argument('-l', '--log', type=int, default=1)
+    # -a работа в цикле событий asyncio вместо потоков
+    args.add_argument('-a', '--asyncio', action='store_true')
+    # -w количество рабочих процессов с общим портом (SO_REUSEPORT), 0 -- один процесс
+    args.add_argument('-w', '--workers', type=int, default=0)
     values = args.parse_args(sys.argv[1:])
-    stream = Architect(values.port, values.button)
-    stream.start()
+    stream = Architect(values.port, values.button, log_every=values.log)
+    if values.asyncio:
+        asyncio.run(stream.serve())
+    elif values.workers:
+        stream.start_workers(values.workers)
+    else:
+        stream.start()
@@ -0,0 +1,227 @@
+import pygpiolib as gpio
+import gpiocdev
+import errno
+import os
+import select
+import shutil
+import tempfile
+import time
+
+
+class SimulatedBackend(gpio.SysfsBackend):
+    """
+    Имитация sysfs GPIO во временном каталоге для запуска без платы. Запись в export/unexport создает и удаляет
+    каталог gpioN с файлами direction, edge, value и active_low. События на линиях вызываются методом inject() и
+    будят ожидающие click(), ButtonMultiplexer и asyncio через eventfd.
+        with SimulatedBackend() as sim:
+            with gpio.Button(3, 'rising') as button:
+                sim.inject(3, 1)
+                button.click()
+    """
+    def __init__(self, root: str = None, ngpio: int = 1024):
+        """
+        :param root: каталог имитации, по умолчанию -- новый временный каталог, удаляемый при выходе
+        :param ngpio: количество доступных gpio - линий
+        """
+        self.temporary = root is None
+        super().__init__(tempfile.mkdtemp(prefix="pygpio-") if root is None else root)
+        self.ngpio = ngpio
+        self.previous = None
+        # gpio_line -> eventfd, сигнализирующий о событии на линии
+        self.edges = {}
+        for name in ("export", "unexport"):
+            gpio.unsafe_write(f"{self.root}/{name}", "")
+
+    def export(self, gpio_line) -> None:
+        line = int(gpio_line)
+        if not 0 <= line < self.ngpio:
+            raise OSError(f"Недопустимая gpio - линия: {gpio_line}")
+        if os.path.exists(self.line_path(line)):
+            raise OSError(f"Линия {gpio_line} уже экспортирована!")
+        gpio.unsafe_write(f"{self.root}/export", line)
+        os.mkdir(self.line_path(line))
+        for name, value in (("direction", "in"), ("edge", "none"), ("value", 0), ("active_low", 0)):
+            gpio.unsafe_write(f"{self.line_path(line)}{name}", value)
+        self.edges[line] = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+
+    def unexport(self, gpio_line) -> None:
+        line = int(gpio_line)
+        if not os.path.exists(self.line_path(line)):
+            raise OSError(f"Линия {gpio_line} не экспортирована!")
+        gpio.unsafe_write(f"{self.root}/unexport", line)
+        shutil.rmtree(self.line_path(line))
+        os.close(self.edges.pop(line))
+
+    def direction(self, gpio_line, direction: str) -> None:
+        if direction in ("high", "low"):
+            self.store(gpio_line, int(direction == "high"))
+            direction = "out"
+        super().direction(gpio_line, direction)
+
+    def watch(self, gpio_line, fd: int) -> tuple:
+        return self.edges[int(gpio_line)], select.EPOLLIN
+
+    def acknowledge(self, gpio_line, fd: int) -> gpio.Edge:
+        try:
+            os.eventfd_read(self.edges[int(gpio_line)])
+        except BlockingIOError:
+            pass
+        return gpio.Edge(time.monotonic(), int(os.pread(fd, 2, 0)[:1]))
+
+    def attribute(self, gpio_line, name: str) -> str:
+        """Текущее содержимое атрибута линии (direction, edge, value, active_low)"""
+        with open(f"{self.line_path(gpio_line)}{name}", "r") as reader:
+            return reader.read().strip()
+
+    def store(self, gpio_line, value: int) -> None:
+        """
+        Записывает значение в файл value линии без события. Файл не усекается: значение всегда один байт, поэтому
+        читатели в других потоках не могут застать файл пустым (в отличие от записи через open("w"))
+        """
+        fd = os.open(f"{self.line_path(gpio_line)}value", os.O_WRONLY)
+        try:
+            os.pwrite(fd, gpio.VALUES[value], 0)
+        finally:
+            os.close(fd)
+
+    def inject(self, gpio_line, value: int) -> bool:
+        """
+        Имитирует изменение внешнего сигнала на входной линии
+        :param gpio_line: gpio - линия, настроенная на вход
+        :param value: новое значение 0/1
+        :return: True если изменение соответствует настройке edge и ожидающие будут разбужены
+        """
+        line = int(gpio_line)
+        if value not in (0, 1):
+            raise ValueError("Недопустимое значение линии!")
+        if self.attribute(line, "direction") != "in":
+            raise ValueError("Событие можно вызвать только на входной линии!")
+        previous = int(self.attribute(line, "value"))
+        self.store(line, value)
+        edge = self.attribute(line, "edge")
+        fire = previous != value and (edge == "both" or edge == ("rising" if value else "falling"))
+        if fire:
+            os.eventfd_write(self.edges[line], 1)
+        return fire
+
+    def open(self):
+        self.previous = gpio.set_backend(self)
+
+    def close(self):
+        """Отменяет экспорт всех линий, восстанавливает предыдущий backend и удаляет временный каталог"""
+        for line in list(self.edges):
+            self.unexport(line)
+        if self.previous is not None:
+            gpio.set_backend(self.previous)
+            self.previous = None
+        if self.temporary:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"SimulatedBackend: {self.root}"
+
+    def __str__(self):
+        return f"SimulatedBackend: {self.root}"
+
+
+class FakeChip:
+    """
+    Имитация символьного устройства gpiochip для gpiocdev.ChipBackend (передается как shim). Обрабатывает ioctl
+    uAPI v2 в памяти, дескрипторы запросов -- неблокирующие pipe, в которые inject() пишет события gpio_v2_line_event.
+        with gpiocdev.ChipBackend(shim=FakeChip()):
+            ...
+    """
+    def __init__(self, ngpio: int = 64):
+        self.ngpio = ngpio
+        # Текущие значения всех линий чипа, бит -- номер линии
+        self.values = 0
+        # Количество выполненных ioctl
+        self.calls = 0
+        # Дескриптор запроса -> (номера линий, флаги, дескриптор записи событий)
+        self.requests = {}
+        self.seqno = 0
+
+    def open(self, path: str) -> int:
+        return os.eventfd(0, os.EFD_CLOEXEC)
+
+    def ioctl(self, fd: int, request: int, buf: bytearray) -> None:
+        self.calls += 1
+        if request == gpiocdev.GPIO_V2_GET_LINE_IOCTL:
+            self.get_line(buf)
+        elif request == gpiocdev.GPIO_V2_LINE_SET_VALUES_IOCTL:
+            bits, mask = gpiocdev.LINE_VALUES.unpack(buf)
+            for i, offset in enumerate(self.requests[fd][0]):
+                if mask >> i & 1:
+                    self.values = self.values & ~(1 << offset) | (bits >> i & 1) << offset
+        elif request == gpiocdev.GPIO_V2_LINE_GET_VALUES_IOCTL:
+            _, mask = gpiocdev.LINE_VALUES.unpack(buf)
+            bits = 0
+            for i, offset in enumerate(self.requests[fd][0]):
+                if mask >> i & 1:
+                    bits |= (self.values >> offset & 1) << i
+            gpiocdev.LINE_VALUES.pack_into(buf, 0, bits, mask)
+        else:
+            raise OSError(errno.ENOTTY, os.strerror(errno.ENOTTY))
+
+    def get_line(self, buf: bytearray) -> None:
+        fields = gpiocdev.LINE_REQUEST.unpack_from(buf)
+        num_lines = fields[-3]
+        offsets = fields[:num_lines]
+        flags, num_attrs = fields[65], fields[66]
+        busy = {offset for lines, _, _ in self.requests.values() for offset in lines}
+        for offset in offsets:
+            if not 0 <= offset < self.ngpio:
+                raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+            if offset in busy:
+                raise OSError(errno.EBUSY, os.strerror(errno.EBUSY))
+        for n in range(num_attrs):
+            attr_id, _, values, mask = fields[67 + 4 * n:71 + 4 * n]
+            if attr_id == gpiocdev.GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES:
+                for i, offset in enumerate(offsets):
+                    if mask >> i & 1:
+                        self.values = self.values & ~(1 << offset) | (values >> i & 1) << offset
+        reader, writer = os.pipe()
+        os.set_blocking(reader, False)
+        self.requests[reader] = (offsets, flags, writer)
+        struct_fd = gpiocdev.LINE_REQUEST.size - 4
+        buf[struct_fd:] = reader.to_bytes(4, 'little', signed=True)
+
+    def read(self, fd: int, size: int) -> bytes:
+        return os.read(fd, size)
+
+    def close(self, fd: int) -> None:
+        if fd in self.requests:
+            os.close(self.requests.pop(fd)[2])
+        os.close(fd)
+
+    def inject(self, offset: int, value: int) -> bool:
+        """
+        Имитирует изменение внешнего сигнала на входной линии чипа
+        :return: True если событие записано в дескриптор запроса
+        """
+        self.values = self.values & ~(1 << offset) | value << offset
+        for lines, flags, writer in self.requests.values():
+            if offset not in lines or not flags & gpiocdev.GPIO_V2_LINE_FLAG_INPUT:
+                continue
+            edge = gpiocdev.GPIO_V2_LINE_FLAG_EDGE_RISING if value else gpiocdev.GPIO_V2_LINE_FLAG_EDGE_FALLING
+            if flags & edge:
+                self.seqno += 1
+                event_id = gpiocdev.GPIO_V2_LINE_EVENT_RISING_EDGE if value else \
+                    gpiocdev.GPIO_V2_LINE_EVENT_FALLING_EDGE
+                os.write(writer, gpiocdev.LINE_EVENT.pack(time.monotonic_ns(), event_id, offset, self.seqno,
+                                                          self.seqno))
+                return True
+        return False
+
+    def __repr__(self):
+        return f"FakeChip: {self.ngpio} lines"
+
+    def __str__(self):
+        return f"FakeChip: {self.ngpio} lines"
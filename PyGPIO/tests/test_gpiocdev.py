@@ -0,0 +1,60 @@
+import gpiocdev
+import pygpiolib as gpio
+import simgpio
+import unittest
+
+
+class ChipBackendTest(unittest.TestCase):
+    """ChipBackend поверх имитации символьного устройства"""
+    def setUp(self):
+        self.chip = simgpio.FakeChip()
+        self.backend = gpiocdev.ChipBackend(shim=self.chip)
+        self.backend.open()
+
+    def tearDown(self):
+        self.backend.close()
+
+    def test_group_single_ioctl(self):
+        with gpio.LineGroup([1, 2, 3]) as group:
+            calls = self.chip.calls
+            self.assertEqual(group.write(0b101), 2)
+            self.assertEqual(self.chip.calls, calls + 1)
+            self.assertEqual(self.chip.values, 0b1010)
+            # Без изменений ioctl не выполняется
+            self.assertEqual(group.write(0b101), 0)
+            self.assertEqual(self.chip.calls, calls + 1)
+            self.assertEqual(group.read(), 0b101)
+            self.assertEqual([led.value for led in group], [1, 0, 1])
+        self.assertEqual(self.chip.values, 0)
+        self.assertEqual(self.chip.requests, {})
+
+    def test_group_member_close(self):
+        with gpio.LineGroup([1, 2, 3]) as group:
+            group[0].close()
+            # Запрос разделяется линиями группы и остается открытым
+            self.assertEqual(len(self.chip.requests), 1)
+            group.write(0b110)
+            self.assertEqual(group.read() & 0b110, 0b110)
+        self.assertEqual(self.chip.requests, {})
+
+    def test_button_event(self):
+        with gpio.Button(5, 'rising', cached=True) as button:
+            self.assertFalse(self.chip.inject(5, 0))
+            self.assertTrue(self.chip.inject(5, 1))
+            self.assertTrue(button.click(1))
+            self.assertEqual(button.events[-1].value, 1)
+            self.assertEqual(button.read(), 1)
+            self.assertFalse(button.click(0.01))
+
+    def test_busy_line(self):
+        with gpio.Led(4):
+            with self.assertRaises(OSError):
+                gpio.Led(4).open('out')
+
+    def test_sysfs_only(self):
+        with self.assertRaises(ValueError):
+            gpio.gpio_exists(4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import protocol
+import time
+import unittest
+
+
+class OlderTest(unittest.TestCase):
+    def test_order(self):
+        self.assertTrue(protocol.older(5, 5))
+        self.assertTrue(protocol.older(4, 5))
+        self.assertFalse(protocol.older(6, 5))
+
+    def test_wraparound(self):
+        self.assertTrue(protocol.older(0xFFFFFFFF, 0))
+        self.assertFalse(protocol.older(0, 0xFFFFFFFF))
+
+    def test_window(self):
+        # Номер, отстающий больше чем на window, -- перезапуск отправителя, а не повтор
+        self.assertFalse(protocol.older(5, 5 + (1 << 16)))
+        self.assertTrue(protocol.older(5, 15, window=16))
+        self.assertFalse(protocol.older(5, 25, window=16))
+
+
+class RetransmitterTest(unittest.TestCase):
+    def test_ack(self):
+        sender = protocol.Retransmitter(rto=0.05)
+        sender.sent('peer', 1, b'one')
+        self.assertTrue(sender.ack('peer', 1))
+        self.assertFalse(sender.ack('peer', 1))
+        self.assertFalse(sender.ack('other', 1))
+        time.sleep(0.06)
+        self.assertEqual(sender.due(), [])
+        self.assertEqual(sender.statistics()['counters'], {'sent': 1, 'acked': 1, 'retransmitted': 0})
+
+    def test_retransmit_backoff(self):
+        sender = protocol.Retransmitter(rto=0.05, min_rto=0.05, retries=2)
+        sender.sent('peer', 7, b'data')
+        self.assertEqual(sender.due(), [])
+        time.sleep(0.06)
+        self.assertEqual(sender.due(), [(b'data', 'peer')])
+        # Таймаут удваивается после повтора
+        time.sleep(0.06)
+        self.assertEqual(sender.due(), [])
+        time.sleep(0.06)
+        self.assertEqual(sender.due(), [(b'data', 'peer')])
+        time.sleep(0.25)
+        self.assertEqual(sender.due(), [])
+        counters = sender.statistics()['counters']
+        self.assertEqual((counters['retransmitted'], counters['failed']), (2, 1))
+        self.assertEqual(sender.statistics()['pending'], 0)
+
+    def test_window(self):
+        sender = protocol.Retransmitter(window=2)
+        for sequence in range(3):
+            sender.sent('peer', sequence, b'')
+        self.assertFalse(sender.ack('peer', 0))
+        self.assertTrue(sender.ack('peer', 2))
+        self.assertEqual(sender.statistics()['counters']['dropped'], 1)
+
+    def test_rto_adapts(self):
+        sender = protocol.Retransmitter(rto=1.0, min_rto=0.01)
+        sender.sent('peer', 1, b'')
+        sender.ack('peer', 1)
+        self.assertLess(sender.peers['peer'].rto, 1.0)
+        self.assertLessEqual(sender.timeout(0.5), 0.5)
+        sender.forget('peer')
+        self.assertEqual(sender.peers, {})
+
+
+class DeduplicatorTest(unittest.TestCase):
+    def test_accept(self):
+        seen = protocol.Deduplicator(size=2)
+        self.assertTrue(seen.accept(1))
+        self.assertFalse(seen.accept(1))
+        self.assertTrue(seen.accept(2))
+        self.assertTrue(seen.accept(3))
+        # Номер 1 вытеснен из памяти
+        self.assertTrue(seen.accept(1))
+        self.assertFalse(seen.accept(3))
+
+
+class EncodingTest(unittest.TestCase):
+    def test_round_trip(self):
+        data = protocol.encode(42, [(3, protocol.OP_SET, 1), (4, protocol.OP_SWITCH, 0)])
+        self.assertTrue(protocol.is_binary(data))
+        sequence, commands = protocol.decode(data)
+        self.assertEqual(sequence, 42)
+        self.assertEqual(commands, [(3, protocol.OP_SET, 1), (4, protocol.OP_SWITCH, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
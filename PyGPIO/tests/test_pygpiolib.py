@@ -0,0 +1,229 @@
+import pygpiolib as gpio
+import simgpio
+import threading
+import time
+import unittest
+
+
+class SimulatedTestCase(unittest.TestCase):
+    """Каждый тест работает с собственной имитацией sysfs"""
+    def setUp(self):
+        self.sim = simgpio.SimulatedBackend()
+        self.sim.open()
+
+    def tearDown(self):
+        self.sim.close()
+
+
+class ButtonTest(SimulatedTestCase):
+    def test_click_timeout(self):
+        with gpio.Button(3, 'rising') as button:
+            start = time.monotonic()
+            self.assertFalse(button.click(0.05))
+            self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_click_ignores_other_edge(self):
+        with gpio.Button(3, 'rising') as button:
+            self.assertFalse(self.sim.inject(3, 0))
+            self.assertTrue(self.sim.inject(3, 1))
+            self.assertTrue(button.click(1))
+            self.assertFalse(self.sim.inject(3, 0))
+            self.assertFalse(button.click(0.05))
+
+    def test_click_cached(self):
+        button = gpio.Button(3, 'both', cached=True)
+        with button:
+            self.assertIsNotNone(button.fd)
+            self.sim.inject(3, 1)
+            self.assertTrue(button.click(1))
+            self.assertEqual(button.events[-1].value, 1)
+            self.assertEqual(button.read(), 1)
+
+    def test_click_wakes_waiting_thread(self):
+        with gpio.Button(3, 'rising') as button:
+            result = []
+            thread = threading.Thread(target=lambda: result.append(button.click(2)))
+            thread.start()
+            time.sleep(0.05)
+            self.sim.inject(3, 1)
+            thread.join()
+            self.assertEqual(result, [True])
+
+    def test_debounce(self):
+        with gpio.Button(3, 'both', debounce=0.2) as button:
+            self.sim.inject(3, 1)
+            self.assertTrue(button.click(1))
+            # Срабатывание в пределах debounce отбрасывается, click() дожидается таймаута
+            self.sim.inject(3, 0)
+            self.assertFalse(button.click(0.05))
+            self.assertEqual(button.bounces, 1)
+            self.assertEqual(len(button.events), 1)
+
+    def test_accept(self):
+        button = gpio.Button(3, debounce=0.1)
+        self.assertTrue(button.accept(1, 10.0))
+        self.assertFalse(button.accept(0, 10.05))
+        self.assertTrue(button.accept(0, 10.2))
+        self.assertEqual(button.bounces, 1)
+        self.assertEqual([edge.value for edge in button.events], [1, 0])
+
+    def test_edge_hook(self):
+        seen = []
+        hook = lambda button, value, timestamp, accepted: seen.append((button.gpio_line, value, accepted))
+        gpio.add_hook('edge', hook)
+        try:
+            button = gpio.Button(3, debounce=1)
+            button.accept(1, 0.0)
+            button.accept(0, 0.5)
+        finally:
+            gpio.remove_hook('edge', hook)
+        self.assertEqual(seen, [(3, 1, True), (3, 0, False)])
+
+
+class ButtonMultiplexerTest(SimulatedTestCase):
+    def test_poll(self):
+        pressed = []
+        first, second = gpio.Button(3, 'rising'), gpio.Button(4, 'rising')
+        with gpio.ButtonMultiplexer([first]) as mux:
+            mux.add(second, lambda button, value: pressed.append((button.gpio_line, value)))
+            self.assertEqual(mux.poll(0.05), [])
+            self.sim.inject(3, 1)
+            self.sim.inject(4, 1)
+            fired = mux.poll(1)
+            self.assertEqual(set(fired), {first, second})
+            self.assertEqual(mux.events.get_nowait(), (first, 1))
+            self.assertEqual(pressed, [(4, 1)])
+        # Кнопки, открытые мультиплексором, закрываются вместе с ним
+        self.assertFalse(first.opened)
+        self.assertFalse(gpio.gpio_exists(3))
+
+    def test_opened_button_stays_open(self):
+        button = gpio.Button(5, 'both')
+        button.open('in', 'both')
+        try:
+            self.assertIsNone(button.fd)
+            with gpio.ButtonMultiplexer([button]) as mux:
+                self.sim.inject(5, 1)
+                self.assertEqual(mux.poll(1), [button])
+            # Мультиплексор закрывает только открытый им файл value, линия остается экспортированной
+            self.assertTrue(button.opened)
+            self.assertIsNone(button.fd)
+            self.assertTrue(gpio.gpio_exists(5))
+        finally:
+            button.close()
+
+    def test_remove(self):
+        button = gpio.Button(3, 'rising')
+        with gpio.ButtonMultiplexer([button]) as mux:
+            mux.remove(button)
+            self.assertFalse(button.opened)
+            self.assertEqual(mux.poll(0.01), [])
+
+    def test_stop(self):
+        with gpio.ButtonMultiplexer([gpio.Button(3)]) as mux:
+            thread = threading.Thread(target=mux.run)
+            thread.start()
+            mux.stop()
+            thread.join(1)
+            self.assertFalse(thread.is_alive())
+
+
+class LineGroupTest(SimulatedTestCase):
+    def test_write_changed_only(self):
+        written = []
+        hook = lambda led, value: written.append((led.gpio_line, value))
+        with gpio.LineGroup([10, 11, 12]) as group:
+            gpio.add_hook('output', hook)
+            try:
+                self.assertEqual(group.write(0b101), 2)
+                self.assertEqual(group.write(0b101), 0)
+                self.assertEqual(group.write([1, 1, 0]), 2)
+            finally:
+                gpio.remove_hook('output', hook)
+            self.assertEqual(written, [(10, 1), (12, 1), (11, 1), (12, 0)])
+            self.assertEqual(group.value, 0b011)
+            self.assertEqual(group.read(), 0b011)
+            self.assertEqual(self.sim.attribute(12, 'value'), '0')
+        # close() выключает все линии
+        self.assertFalse(gpio.gpio_exists(10))
+
+    def test_mask(self):
+        group = gpio.LineGroup([10, 11])
+        self.assertEqual(group.mask(b'\x01\x00'), 0b01)
+        for states in (0b100, -1, [1], [2, 0]):
+            with self.assertRaises(ValueError):
+                group.mask(states)
+
+
+class RegistryTest(SimulatedTestCase):
+    def test_tracks_export(self):
+        self.assertFalse(gpio.gpio_exists(7))
+        gpio.gpio_open(7, 'out')
+        self.assertTrue(gpio.registry.exported(7))
+        self.assertEqual(gpio.registry.get(7, 'direction'), 'out')
+        gpio.gpio_close(7)
+        self.assertFalse(gpio.gpio_exists(7))
+        with self.assertRaises(ValueError):
+            gpio.gpio_unexport(7)
+
+    def test_refresh(self):
+        gpio.registry.seed()
+        # Экспорт в обход модуля (другим процессом) виден только после refresh()
+        self.sim.export(8)
+        self.assertFalse(gpio.gpio_exists(8))
+        gpio.registry.refresh()
+        self.assertTrue(gpio.gpio_exists(8))
+        self.assertEqual(gpio.registry.get(8, 'direction'), 'in')
+        self.assertEqual(gpio.registry.get(8, 'edge'), 'none')
+
+    def test_seed_follows_backend(self):
+        gpio.gpio_open(7, 'in')
+        with simgpio.SimulatedBackend():
+            self.assertFalse(gpio.gpio_exists(7))
+        self.assertTrue(gpio.gpio_exists(7))
+        gpio.gpio_close(7)
+
+    def test_configure_skips_known(self):
+        written = []
+        hook = lambda path, value: written.append(path.rsplit('/', 1)[-1])
+        gpio.gpio_open(7, 'in', 'both')
+        gpio.add_hook('write', hook)
+        try:
+            gpio.gpio_configure(7, 'in', 'both')
+            gpio.gpio_configure(7, 'in', 'rising')
+        finally:
+            gpio.remove_hook('write', hook)
+        self.assertEqual(written, ['edge'])
+        self.assertEqual(self.sim.attribute(7, 'edge'), 'rising')
+
+
+class SimulatedBackendTest(SimulatedTestCase):
+    def test_inject_during_reads(self):
+        # Чтение значения во время inject() не должно застать файл value пустым
+        with gpio.Button(3, 'both', cached=True) as button:
+            done = threading.Event()
+            errors = []
+
+            def reader():
+                while not done.is_set():
+                    try:
+                        button.read()
+                    except ValueError as exc:
+                        errors.append(exc)
+                        return
+            thread = threading.Thread(target=reader)
+            thread.start()
+            for i in range(2000):
+                self.sim.inject(3, i & 1)
+            done.set()
+            thread.join()
+            self.assertEqual(errors, [])
+
+    def test_inject_output(self):
+        with gpio.Led(3):
+            with self.assertRaises(ValueError):
+                self.sim.inject(3, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()